@@ -0,0 +1,259 @@
+#!/usr/bin/python
+"""Streaming analysis of port stats traces.
+
+    python analytics.py port_stats.csv --top 10 --blocks --histogram
+    python analytics.py port_stats.csv --convert port_stats.col
+    python analytics.py port_stats.col --port 3:1 --field rx_throughput
+
+Traces (the CSV or binary written by stats_sink, or the columnar format
+written by --convert) are read in chunks of chunk_rows rows, each a set of
+typed array columns, so memory stays bounded whatever the trace size. The
+aggregations only keep per-port state between chunks.
+
+The CSV blocklist column is parsed with ast.literal_eval only when it differs
+from the previous row, and turned into block/unblock events. Binary traces
+have no blocklist, so they have no block timeline.
+"""
+import argparse
+import ast
+import bisect
+import csv
+import struct
+import time
+from array import array
+
+from stats_sink import MAGIC, RECORD
+
+COLUMNS = [
+    ('timestamp', 'd'),
+    ('dpid', 'Q'),
+    ('port_no', 'I'),
+    ('rx_bytes', 'Q'),
+    ('tx_bytes', 'Q'),
+    ('rx_throughput', 'd'),
+    ('tx_throughput', 'd'),
+    ('num_active_ports', 'i'),
+]
+
+# formato colonnare: COLUMNAR_MAGIC, poi per ogni chunk CHUNK_HEADER (righe, eventi),
+# le colonne una dopo l'altra in ordine COLUMNS e gli eventi di blocco
+COLUMNAR_MAGIC = b'NCISCOL1'
+CHUNK_HEADER = struct.Struct('<II')
+BLOCK_EVENT = struct.Struct('<dQIb') # timestamp, dpid, porta, 1 blocco / 0 sblocco
+
+# byte/s come i rate delle tracce: da 1 kB/s a 10 GB/s, quattro bucket per decade
+RATE_EDGES = [10 ** (3 + i / 4) for i in range(29)]
+
+
+class Chunk(object):
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.blocks = [] # (timestamp, dpid, porta, 1 blocco / 0 sblocco)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+
+def _read_csv(path, chunk_rows):
+    stamps = {}
+    previous_blocklist = '{}'
+    blocked = set()
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        column = {name: i for i, name in enumerate(next(reader))}
+        indexes = [column[name] for name, _ in COLUMNS[1:]]
+        block_i = column.get('blocklist')
+        chunk = Chunk()
+        arrays = [getattr(chunk, name) for name, _ in COLUMNS[1:]]
+        for row in reader:
+            stamp = row[0]
+            ts = stamps.get(stamp)
+            if ts is None:
+                if len(stamps) > 4096:
+                    stamps.clear()
+                ts = stamps[stamp] = time.mktime(time.strptime(stamp, '%Y-%m-%d %H:%M:%S'))
+            chunk.timestamp.append(ts)
+            for column_array, i in zip(arrays, indexes):
+                value = row[i]
+                column_array.append(float(value) if column_array.typecode == 'd' else int(value))
+
+            if block_i is not None and row[block_i] != previous_blocklist:
+                previous_blocklist = row[block_i]
+                current = {key for key in ast.literal_eval(previous_blocklist) if len(key) == 2}
+                for dpid, port_no in sorted(current - blocked):
+                    chunk.blocks.append((ts, dpid, port_no, 1))
+                for dpid, port_no in sorted(blocked - current):
+                    chunk.blocks.append((ts, dpid, port_no, 0))
+                blocked = current
+
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = Chunk()
+                arrays = [getattr(chunk, name) for name, _ in COLUMNS[1:]]
+        if len(chunk):
+            yield chunk
+
+
+def _read_binary(path, chunk_rows):
+    with open(path, 'rb') as f:
+        f.read(len(MAGIC))
+        while True:
+            data = f.read(RECORD.size * chunk_rows)
+            if not data:
+                break
+            chunk = Chunk()
+            arrays = [getattr(chunk, name) for name, _ in COLUMNS]
+            for record in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]):
+                for column_array, value in zip(arrays, record):
+                    column_array.append(value)
+            yield chunk
+
+
+def _read_columnar(path):
+    with open(path, 'rb') as f:
+        f.read(len(COLUMNAR_MAGIC))
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if not header:
+                break
+            rows, events = CHUNK_HEADER.unpack(header)
+            chunk = Chunk()
+            for name, _ in COLUMNS:
+                column_array = getattr(chunk, name)
+                column_array.frombytes(f.read(rows * column_array.itemsize))
+            chunk.blocks = list(BLOCK_EVENT.iter_unpack(f.read(events * BLOCK_EVENT.size)))
+            yield chunk
+
+
+def read_chunks(path, chunk_rows=65536):
+    """Yield the trace as Chunks, whatever its format."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == COLUMNAR_MAGIC:
+        return _read_columnar(path)
+    if magic == MAGIC:
+        return _read_binary(path, chunk_rows)
+    return _read_csv(path, chunk_rows)
+
+
+def convert(chunks, path):
+    rows = 0
+    with open(path, 'wb') as f:
+        f.write(COLUMNAR_MAGIC)
+        for chunk in chunks:
+            f.write(CHUNK_HEADER.pack(len(chunk), len(chunk.blocks)))
+            for name, _ in COLUMNS:
+                f.write(getattr(chunk, name).tobytes())
+            f.write(b''.join(BLOCK_EVENT.pack(*event) for event in chunk.blocks))
+            rows += len(chunk)
+    return rows
+
+
+def port_series(chunks, dpid, port_no, field='rx_throughput'):
+    """(timestamps, values) of one column for one port."""
+    timestamps = array('d')
+    values = array(dict(COLUMNS)[field])
+    for chunk in chunks:
+        column = getattr(chunk, field)
+        for i in _port_rows(chunk, dpid, port_no):
+            timestamps.append(chunk.timestamp[i])
+            values.append(column[i])
+    return timestamps, values
+
+
+def _port_rows(chunk, dpid, port_no):
+    dpids, ports = chunk.dpid, chunk.port_no
+    return [i for i in range(len(chunk)) if dpids[i] == dpid and ports[i] == port_no]
+
+
+def top_talkers(chunks, n=10):
+    """Ports that received the most bytes: [((dpid, port), rx_bytes, peak rx_throughput)].
+
+    rx_bytes are cumulative counters, so the volume is last - first sample.
+    """
+    first, last, peak = {}, {}, {}
+    for chunk in chunks:
+        for key, rx_bytes, rx in zip(zip(chunk.dpid, chunk.port_no), chunk.rx_bytes, chunk.rx_throughput):
+            if key not in first:
+                first[key] = rx_bytes
+                peak[key] = rx
+            elif rx > peak[key]:
+                peak[key] = rx
+            last[key] = rx_bytes
+    volumes = [(key, last[key] - first[key], peak[key]) for key in first]
+    volumes.sort(key=lambda item: item[1], reverse=True)
+    return volumes[:n]
+
+
+def block_timeline(chunks):
+    """[(dpid, port, blocked at, unblocked at or None)] from the block events."""
+    open_blocks = {}
+    timeline = []
+    for chunk in chunks:
+        for ts, dpid, port_no, blocked in chunk.blocks:
+            key = (dpid, port_no)
+            if blocked:
+                open_blocks.setdefault(key, ts)
+            elif key in open_blocks:
+                timeline.append((dpid, port_no, open_blocks.pop(key), ts))
+    timeline += [(dpid, port_no, start, None) for (dpid, port_no), start in open_blocks.items()]
+    timeline.sort(key=lambda item: item[2])
+    return timeline
+
+
+def rate_histogram(chunks, field='rx_throughput', edges=RATE_EDGES):
+    """Counts of samples per bucket: counts[0] below edges[0], counts[i] in [edges[i-1], edges[i])."""
+    counts = [0] * (len(edges) + 1)
+    for chunk in chunks:
+        for value in getattr(chunk, field):
+            counts[bisect.bisect_right(edges, value)] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse a port stats trace')
+    parser.add_argument('trace')
+    parser.add_argument('--chunk-rows', type=int, default=65536)
+    parser.add_argument('--convert', metavar='PATH', help='write the trace in the columnar format')
+    parser.add_argument('--top', type=int, metavar='N', help='ports with the most received bytes')
+    parser.add_argument('--port', action='append', default=[], metavar='DPID:PORT', help='print a time series')
+    parser.add_argument('--field', default='rx_throughput', choices=[name for name, _ in COLUMNS[3:]])
+    parser.add_argument('--blocks', action='store_true', help='block timeline')
+    parser.add_argument('--histogram', action='store_true', help='histogram of --field')
+    args = parser.parse_args()
+
+    def chunks():
+        # ogni analisi rilegge la traccia: niente resta in memoria tra una e l'altra
+        return read_chunks(args.trace, args.chunk_rows)
+
+    if args.convert:
+        rows = convert(chunks(), args.convert)
+        print(f'# {rows} rows written to {args.convert}')
+    for item in args.port:
+        dpid, _, port_no = item.partition(':')
+        timestamps, values = port_series(chunks(), int(dpid), int(port_no), args.field)
+        print(f'timestamp,{args.field}  # switch {dpid} port {port_no}')
+        for ts, value in zip(timestamps, values):
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))},{value}")
+    if args.top:
+        print('dpid,port_no,rx_bytes,peak_rx_throughput')
+        for (dpid, port_no), volume, peak in top_talkers(chunks(), args.top):
+            print(f'{dpid},{port_no},{volume},{peak:.1f}')
+    if args.blocks:
+        print('dpid,port_no,blocked,unblocked,duration')
+        for dpid, port_no, start, end in block_timeline(chunks()):
+            stop = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end)) if end is not None else ''
+            duration = f'{end - start:.0f}' if end is not None else ''
+            print(f"{dpid},{port_no},{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))},{stop},{duration}")
+    if args.histogram:
+        counts = rate_histogram(chunks(), args.field)
+        print(f'lower,upper,samples  # {args.field}')
+        bounds = [0.0] + RATE_EDGES + [float('inf')]
+        for lower, upper, count in zip(bounds, bounds[1:], counts):
+            if count:
+                print(f'{lower:.0f},{upper:.0f},{count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/python
+"""Benchmarks for the controller hot paths, without Mininet or switches.
+
+    python bench.py
+    python bench.py --ports 10,100,1000,10000 --events 2000 --output bench_output.txt
+    python bench.py --only port_stats --rate 500
+
+A FakeDatapath stands in for the switches (send_msg only counts messages)
+and synthetic EventOFPPacketIn / EventOFPPortStatsReply events are handed
+straight to the SimpleSwitch13 handlers. The metrics server, the state log
+and clustering are turned off, so every port count gets a fresh app. For every scenario and port count
+the throughput (events/s), p50/p99 handler latency and the memory allocated
+per event (tracemalloc, in a separate pass) are reported.
+"""
+import argparse
+import os
+import random
+import struct
+import tempfile
+import time
+import tracemalloc
+
+from ryu.controller import ofp_event
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+import controller
+
+
+class FakeDatapath(object):
+    def __init__(self, dpid):
+        self.id = dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.sent = 0
+        self.xid = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        self.sent += 1
+
+
+class Bench(object):
+    def __init__(self, ports, ports_per_switch=48, limits=False):
+        # niente server HTTP, log di stato o database condiviso: solo i gestori
+        os.environ['NCIS_METRICS_PORT'] = 'off'
+        os.environ['NCIS_STATE'] = 'off'
+        os.environ.pop('NCIS_CLUSTER', None)
+        self.app = controller.SimpleSwitch13()
+        if not limits:
+            # si misura il costo dei gestori, non quello dei pacchetti scartati
+            for limiter in (self.app.switch_packet_in_limit, self.app.port_packet_in_limit,
+                            self.app.source_packet_in_limit):
+                limiter.rate = limiter.burst = float('inf')
+
+        self.ports = []
+        self.datapaths = []
+        self.switch_ports = {}
+        for i in range(0, ports, ports_per_switch):
+            dp = FakeDatapath(len(self.datapaths) + 1)
+            self.datapaths.append(dp)
+            self.app.datapaths[dp.id] = dp
+            self.app._take_over(dp)
+            self.switch_ports[dp.id] = min(ports_per_switch, ports - i)
+            self.ports += [(dp, port_no) for port_no in range(1, self.switch_ports[dp.id] + 1)]
+        self.counters = {(dp.id, port_no): 0 for dp, port_no in self.ports}
+        self.macs = [struct.pack('!HI', 0, i + 1) for i in range(len(self.ports))]
+
+    def packet_in(self):
+        parser = ofproto_v1_3_parser
+        i = random.randrange(len(self.ports))
+        dp, port_no = self.ports[i]
+        frame = random.choice(self.macs) + self.macs[i] + b'\x08\x00' + b'\x00' * 46
+        msg = parser.OFPPacketIn(dp, buffer_id=ofproto_v1_3.OFP_NO_BUFFER, total_len=len(frame),
+                                 reason=ofproto_v1_3.OFPR_NO_MATCH, table_id=controller.L2_TABLE,
+                                 match=parser.OFPMatch(in_port=port_no), data=frame)
+        msg.msg_len = len(frame)
+        ev = ofp_event.EventOFPPacketIn(msg)
+        return self.app._packet_in_handler, ev
+
+    def port_stats(self):
+        parser = ofproto_v1_3_parser
+        dp = random.choice(self.datapaths)
+        body = []
+        for port_no in range(1, self.switch_ports[dp.id] + 1):
+            key = (dp.id, port_no)
+            self.counters[key] += random.randint(0, 500000)
+            count = self.counters[key]
+            body.append(parser.OFPPortStats(port_no=port_no, rx_packets=count // 1000, tx_packets=count // 1000,
+                                            rx_bytes=count, tx_bytes=count // 2, rx_dropped=0, tx_dropped=0,
+                                            rx_errors=0, tx_errors=0, rx_frame_err=0, rx_over_err=0,
+                                            rx_crc_err=0, collisions=0, duration_sec=0, duration_nsec=0))
+        msg = parser.OFPPortStatsReply(dp)
+        msg.body = body
+        msg.flags = 0
+        ev = ofp_event.EventOFPPortStatsReply(msg)
+        return self.app._port_stats_reply_handler, ev
+
+    def stats_sink(self):
+        dp = random.choice(self.datapaths)
+        changed = self.app.port_stats.port_nos(dp.id)
+        if not changed:
+            return self.port_stats()
+        return self._write_and_flush, (dp.id, changed)
+
+    def _write_and_flush(self, args):
+        self.app._write_stats(*args)
+        for sink in self.app.stats_sinks:
+            sink.flush()
+
+    def add_flow(self):
+        parser = ofproto_v1_3_parser
+        dp, port_no = random.choice(self.ports)
+        match = parser.OFPMatch(in_port=port_no, eth_dst=random.choice(self.macs).hex(':'))
+        actions = [parser.OFPActionOutput(port_no)]
+        return self._add_flow, (dp, match, actions)
+
+    def _add_flow(self, args):
+        dp, match, actions = args
+        self.app.add_flow(dp, 1, match, actions, table_id=controller.L2_TABLE)
+
+    def close(self):
+        for sink in self.app.stats_sinks:
+            sink.close()
+
+
+SCENARIOS = ['packet_in', 'port_stats', 'stats_sink', 'add_flow']
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q / 100), len(values) - 1)]
+
+
+def run_scenario(bench, name, events, rate):
+    make = getattr(bench, name)
+    # un giro a vuoto: port_stats ha bisogno di due campioni per calcolare i rate
+    for _ in range(min(events, 50)):
+        handler, ev = make()
+        handler(ev)
+
+    latencies = []
+    interval = 1.0 / rate if rate else 0
+    start = time.perf_counter()
+    next_at = start
+    for _ in range(events):
+        handler, ev = make()
+        if interval:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_at += interval
+        t0 = time.perf_counter()
+        handler(ev)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    # allocazioni in un passaggio separato: tracemalloc rallenta molto i gestori
+    samples = min(events, 200)
+    prepared = [make() for _ in range(samples)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for handler, ev in prepared:
+        handler(ev)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'events_per_sec': events / elapsed,
+        'handler_per_sec': events / sum(latencies),
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+        'alloc_per_event': (current - before) / samples,
+        'peak_kib': (peak - before) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the controller hot paths')
+    parser.add_argument('--ports', default='10,100,1000,10000', help='comma separated port counts')
+    parser.add_argument('--ports-per-switch', type=int, default=48)
+    parser.add_argument('--events', type=int, default=2000, help='events per scenario')
+    parser.add_argument('--rate', type=float, default=0, help='events/s to drive (0: as fast as possible)')
+    parser.add_argument('--only', action='append', choices=SCENARIOS)
+    parser.add_argument('--limits', action='store_true', help='keep the packet-in rate limits enabled')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also append the results to this file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    output = os.path.abspath(args.output) if args.output else None
+    # i sink scrivono port_stats.* nella cartella corrente
+    os.chdir(tempfile.mkdtemp(prefix='ncis-bench-'))
+
+    header = f"{'scenario':<12}{'ports':>7}{'events/s':>12}{'handler/s':>12}{'p50 us':>10}{'p99 us':>10}{'B/event':>10}{'peak KiB':>10}"
+    lines = [header]
+    print(header)
+    for ports in [int(p) for p in args.ports.split(',')]:
+        bench = Bench(ports, args.ports_per_switch, args.limits)
+        for name in args.only or SCENARIOS:
+            r = run_scenario(bench, name, args.events, args.rate)
+            line = (f"{name:<12}{ports:>7}{r['events_per_sec']:>12.0f}{r['handler_per_sec']:>12.0f}"
+                    f"{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}{r['alloc_per_event']:>10.0f}{r['peak_kib']:>10.1f}")
+            lines.append(line)
+            print(line, flush=True)
+        bench.close()
+
+    if output:
+        with open(output, 'a') as f:
+            f.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')} events={args.events} rate={args.rate}\n")
+            f.write('\n'.join(lines) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,10 +6,36 @@ from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
 from ryu.lib.packet import ether_types
-import threading
-import time
-import csv
+from ryu.lib import hub
+from ryu.topology import event as topo_event
+from collections import OrderedDict
+import heapq
+import math
 import os
+import socket
+import time
+from stats_sink import make_sink
+from poller import StatsPoller
+from port_store import PortStatsStore
+from detection import evaluate_reply, final_threshold, attribute_congestion
+from rate_estimator import RateEstimator
+from ofp_batcher import FlowModBatcher
+from netgraph import NetworkGraph, DEFAULT_LINKS
+from packet_fast import parse_eth
+from ratelimit import RateLimiter
+from timers import DeadlineHeap
+from sketch import CountMinSketch, SpaceSaving
+from metrics import Registry, timed
+from snapshot import StateLog
+from sharding import ClusterStore, rendezvous_owner
+from offload import DetectionPool, BLOCKED, UNBLOCKED, WATCH, BLOCK, ALARM, ACTIVE
+
+TABLE_MISS_METER = 1 # meter che limita i packet-in generati dalla regola table-miss
+
+# Pipeline a due tabelle: nella 0 le regole di mitigazione (drop o meter), che poi
+# proseguono verso la 1 dove stanno le regole L2 e la table-miss
+MITIGATION_TABLE = 0
+L2_TABLE = 1
 
 class SimpleSwitch13(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
@@ -17,53 +43,456 @@ class SimpleSwitch13(app_manager.RyuApp):
         super(SimpleSwitch13, self).__init__(*args, **kwargs)
         self.mac_to_port = {}
 
+        # piu' processi controller (ryu-manager con --ofp-tcp-listen-port diverse, switch
+        # collegati a tutti) si dividono gli switch con il rendezvous hashing sui dpid: ognuno e'
+        # MASTER dei suoi e SLAVE degli altri. Heartbeat e blocchi passano dal database sqlite
+        # NCIS_CLUSTER; quando un processo smette di battere i suoi switch passano agli altri.
+        # NCIS_NODE da' al processo un nome stabile (file di stato e statistiche sono per nodo)
+        self.cluster_path = os.environ.get('NCIS_CLUSTER')
+        self.node_id = os.environ.get('NCIS_NODE', f'{socket.gethostname()}-{os.getpid()}')
+        self.heartbeat_interval = 1
+        self.cluster = ClusterStore(self.cluster_path, self.node_id) if self.cluster_path else None
+        self.members = [self.node_id]
+        self.owned = set() # dpid di cui questo processo e' MASTER
+        node_suffix = f'.{self.node_id}' if self.cluster is not None else ''
+
+        # modalita' proattiva: appena un host e' noto si installa su tutti gli switch
+        # una regola eth_dst verso di lui, cosi' i packet-in a regime vanno a zero
+        self.proactive_paths = True
+        # topologia dichiarata nel file JSON NCIS_TOPOLOGY (vedi NetworkGraph.from_file, scritto da
+        # 'scenario.py --graph' o Environment.dump_graph). Con 'ryu-manager --observe-links
+        # ryu.topology.switches' i link scoperti via LLDP vengono aggiunti al grafo, che senza file
+        # parte vuoto; senza file ne' LLDP si assume la topologia del progetto (DEFAULT_LINKS)
+        self.topology_file = os.environ.get('NCIS_TOPOLOGY') or None
+        if self.topology_file:
+            self.graph = NetworkGraph.from_file(self.topology_file)
+        elif getattr(self.CONF, 'observe_links', False):
+            self.graph = NetworkGraph()
+        else:
+            self.graph = NetworkGraph(DEFAULT_LINKS)
+        self.hosts = {} # mac -> (dpid, porta di accesso)
+
+        # per src/dst/ethertype basta l'header Ethernet; la decodifica completa con
+        # packet.Packet serve solo se deep_inspection e' attivo
+        self.deep_inspection = False
+        self.fast_path_hits = 0
+        self.slow_path_hits = 0
+
+        # limiti sui packet-in (pacchetti/secondo) per switch, per porta e per MAC sorgente;
+        # una sorgente oltre il limite viene scartata dallo switch per source_drop_time secondi
+        self.switch_packet_in_limit = RateLimiter(rate=1000, burst=2000)
+        self.port_packet_in_limit = RateLimiter(rate=200, burst=400)
+        self.source_packet_in_limit = RateLimiter(rate=50, burst=100)
+        self.source_drop_time = 10
+        # pkt/s massimi inviati al controller da ogni switch, con un meter sulla table-miss
+        # installato solo se lo switch supporta i meter (None: table-miss senza meter)
+        self.table_miss_rate = 2000
+        self.packet_in_accepted = 0
+        self.packet_in_dropped = 0
+        self.source_drops = 0
+
         self.num_active_ports = 0
-        self.active_ports = []
+        self.active_ports = {} # dpid -> insieme delle porte sopra lower_threshold
 
         self.datapaths = {}
-        self.port_stats = {}
-        self.threshold = 300000 # soglia di throughput (bit/secondo)
+        self.port_stats = PortStatsStore()
+        # finestra degli ultimi campioni RX per porta; la rilevazione usa la stima
+        # scelta in detection_rate ('raw', 'ewma', 'p95', 'min', 'max') invece del singolo delta
+        self.rx_rates = RateEstimator(window=8, alpha=0.5)
+        self.detection_rate = 'ewma'
+        self.threshold = 300000 # soglia di throughput (byte/secondo, come tutti i rate calcolati dai contatori)
         self.watchlist = {}
-        self.blocklist = {}
+        self.watch_limit = 1 # una porta in watchlist viene bloccata quando il contatore supera questo valore
+        self.blocklist = {} # (dpid, porta) -> istante in cui il blocco scade
+
+        # durata del blocco: block_time alla prima infrazione, poi raddoppia per i
+        # recidivi fino a max_block_time; dopo offence_memory secondi senza blocchi si riparte
+        self.block_time = 25
+        self.max_block_time = 600
+        self.offence_memory = 600
+        self.offences = {} # (dpid, porta) -> (numero di blocchi, istante dell'ultimo)
+        self.block_timers = DeadlineHeap(wakeup=hub.Event())
+
+        # rilevazione per flusso: invece di chiudere tutta la porta si bloccano solo le
+        # coppie (src, dst) che superano flow_threshold. I byte dei flussi L2 letti con
+        # OFPFlowStatsRequest sugli switch di accesso finiscono in un count-min sketch e
+        # in un top-k, entrambi a memoria fissa, azzerati ogni flow_window secondi.
+        # Richiede le regole L2 per (in_port, src, dst), quindi disattiva quelle proattive.
+        self.flow_detection = False
+        self.flow_threshold = self.threshold # byte/s per singolo flusso
+        self.flow_window = 10
+        self.flow_sketch = CountMinSketch(width=2048, depth=4)
+        self.top_flows = SpaceSaving(k=64)
+        self.flow_bytes = {} # dpid -> {(dpid, in_port, src, dst): byte_count} dell'ultima reply completa
+        self.flow_reply = {} # dpid -> byte_count della reply multipart in arrivo
+        self.flow_window_start = time.time()
+        self.flow_blocklist = {} # (dpid, in_port, src, dst) -> istante in cui il blocco scade
         self.lower_threshold = 0.02 * self.threshold
+        self.monitored_dpids = {3} # switch di aggregazione su cui si rilevano gli attacchi
 
-        self.thread_monitorning = threading.Thread(target=self._monitor)
-        self.thread_monitorning.daemon = True
-        self.thread_monitorning.start()
+        # 'local': rilevazione sulle porte degli switch in monitored_dpids;
+        # 'network': qualunque link tra switch con tx oltre congestion_ratio della capacita'
+        # viene diviso tra le porte di accesso a monte e si bloccano quelle oltre la quota equa,
+        # il piu' vicino possibile alla sorgente
+        self.mitigation_scope = 'local'
+        self.congestion_ratio = 0.9
+        self.default_link_capacity = self.threshold # byte/s come threshold, per i link senza capacita' dichiarata
 
-        self.thread_mitigation = threading.Thread(target=self._limit_rate)
-        self.thread_mitigation.daemon = True
-        self.thread_mitigation.start()
+        # 'block': la porta viene chiusa; 'meter': il traffico della porta viene limitato
+        # alla quota equa (final_threshold) con un meter OpenFlow, che scarta
+        # ('drop') o rimarca il DSCP ('dscp') dell'eccesso
+        self.mitigation_mode = 'block'
+        self.meter_band = 'drop'
+        self.port_meters = {} # (dpid, porta) -> [meter_id, rate in kbps]
+        self.next_meter_id = {} # dpid -> primo meter_id mai usato
+        self.free_meter_ids = {} # dpid -> heap dei meter_id cancellati, riusati prima di next_meter_id
+
+        # formati in cui salvare le statistiche: 'csv' e/o 'bin'; ogni sink scrive da un
+        # thread suo, cosi' l'I/O su disco non blocca l'hub (le righe passano da una coda con lock)
+        self.stats_formats = ['csv']
+        self.stats_sinks = [make_sink(fmt, f'port_stats{node_suffix}.{fmt}') for fmt in self.stats_formats]
+
+        # polling adattivo: le porte calde (in watchlist o vicine alla soglia) ogni secondo,
+        # gli switch inattivi sempre piu' di rado
+        self.hot_ratio = 0.5
+        self.poller = StatsPoller(base_interval=2, min_interval=1, max_interval=8, wakeup=hub.Event())
+
+        # le FlowMod della mitigazione vengono accodate, fuse e inviate a blocchi con una barrier
+        self.batcher = FlowModBatcher(flush_delay=0.05, wakeup=hub.Event())
+
+        # le regole L2 scadono da sole (idle/hard timeout) e lo switch lo notifica con un
+        # FlowRemoved, che tiene allineato mac_to_port. Le regole di blocco hanno come
+        # hard_timeout la durata del blocco: lo sblocco lo fa lo switch, il timer di
+        # block_timers (unblock_grace secondi dopo) resta come riserva. Quando la tabella L2
+        # supera eviction_high di flow_table_size si tolgono le regole piu' vecchie fino a eviction_low
+        self.flow_idle_timeout = 60
+        self.flow_hard_timeout = 600
+        self.unblock_grace = 2
+        self.flow_table_size = 10000
+        self.eviction_high = 0.9
+        self.eviction_low = 0.8
+        self.l2_rules = {} # dpid -> OrderedDict (in_port, src, dst) -> None, dalla meno recente
+        self.l2_dst_rules = {} # dpid -> {dst: regole L2 installate verso dst}
+        self.table_occupancy = {} # dpid -> {table_id: regole attive}
+        self.evictions = 0
+
+        # metriche in formato Prometheus su http://<controller>:metrics_port/metrics; i valori
+        # derivati dallo stato si calcolano solo allo scrape. NCIS_METRICS_PORT sceglie la porta
+        # ('off' le disattiva); in un cluster ogni processo prende una porta libera (0), scritta nel log
+        metrics_port = os.environ.get('NCIS_METRICS_PORT', '0' if self.cluster is not None else '9180')
+        self.metrics_port = None if metrics_port.lower() in ('', 'off', 'none') else int(metrics_port)
+        self.metrics = Registry()
+        self._setup_metrics()
+
+        # detection_workers > 0: la rilevazione locale (stime dei rate, evaluate_reply, porte
+        # attive) gira in processi separati. Il gestore delle reply accoda solo i contatori in un
+        # ring in memoria condivisa e _decision_loop applica al massimo max_decisions decisioni
+        # per giro, cosi' l'hub non resta mai fermo sulla rilevazione. Solo con scope 'local'
+        self.detection_workers = 0
+        self.max_decisions = 256
+        self.decision_interval = 0.01
+        self.detection_pool = None
+        if self.detection_workers and self.mitigation_scope == 'local':
+            self.detection_pool = DetectionPool(self.detection_workers, {
+                'threshold': self.threshold, 'lower_threshold': self.lower_threshold,
+                'watch_limit': self.watch_limit, 'monitored_dpids': sorted(self.monitored_dpids),
+                'detection_rate': self.detection_rate, 'window': self.rx_rates.window, 'alpha': self.rx_rates.alpha,
+            })
+
+        # stato salvato ogni snapshot_interval secondi in un log append-only e ricaricato
+        # all'avvio; quando uno switch si registra le sue regole di mitigazione vengono
+        # confrontate con blocklist e flow_blocklist. NCIS_STATE sceglie il file ('off' o
+        # snapshot_path = None lo disattivano)
+        snapshot_path = os.environ.get('NCIS_STATE', f'controller_state{node_suffix}.log')
+        self.snapshot_path = None if snapshot_path.lower() in ('', 'off', 'none') else snapshot_path
+        self.snapshot_interval = 5
+        self.state_log = StateLog(self.snapshot_path) if self.snapshot_path else None
+        self.reconcile_xids = {} # dpid -> xid della OFPFlowStatsRequest di riconciliazione
+        self.reconcile_rules = {} # dpid -> regole ricevute finora
+        if self.state_log is not None:
+            self._restore_state()
+        if self.cluster is not None:
+            self._join_cluster()
+
+        # Tutti i cicli girano come green thread nell'hub di Ryu, come i gestori degli
+        # eventi: si alternano solo nei punti di attesa, quindi watchlist, blocklist,
+        # port_stats e active_ports non vengono mai modificati in concorrenza
+        self.thread_monitorning = hub.spawn(self._monitor)
+        self.thread_mitigation = hub.spawn(self._limit_rate)
+        self.thread_flush = hub.spawn(self.batcher.run)
+        self.thread_metrics = hub.spawn(self._serve_metrics)
+        self.thread_snapshot = hub.spawn(self._snapshot_loop)
+        self.thread_cluster = hub.spawn(self._cluster_loop)
+        self.thread_decisions = hub.spawn(self._decision_loop)
+
+    def _setup_metrics(self):
+        m = self.metrics
+        store = self.port_stats
+        m.gauge('ncis_port_rx_throughput', 'Last RX throughput of a port', ('dpid', 'port')).set_function(
+            lambda: {(dpid, port_no): store.get(dpid, port_no, 'rx_throughput')
+                     for dpid in store.dpids() for port_no in store.port_nos(dpid)})
+        m.gauge('ncis_port_tx_throughput', 'Last TX throughput of a port', ('dpid', 'port')).set_function(
+            lambda: {(dpid, port_no): store.get(dpid, port_no, 'tx_throughput')
+                     for dpid in store.dpids() for port_no in store.port_nos(dpid)})
+        m.gauge('ncis_active_ports', 'Ports above lower_threshold', ('dpid',)).set_function(
+            lambda: {(dpid,): len(ports) for dpid, ports in self.active_ports.items()})
+        m.gauge('ncis_watchlist_size', 'Ports in the watchlist').set_function(lambda: len(self.watchlist))
+        m.gauge('ncis_blocklist_size', 'Blocked or limited ports').set_function(lambda: len(self.blocklist))
+        m.gauge('ncis_flow_blocklist_size', 'Blocked flows').set_function(lambda: len(self.flow_blocklist))
+        m.gauge('ncis_poll_rate', 'Port stats requests per second', ('dpid',)).set_function(
+            lambda: {(dpid,): rate for dpid, rate in self.poller.poll_rates().items()})
+        m.counter('ncis_packet_in_total', 'Packet-ins by rate limit outcome', ('result',)).set_function(
+            lambda: {('accepted',): self.packet_in_accepted, ('dropped',): self.packet_in_dropped})
+        m.counter('ncis_source_drops_total', 'Sources dropped for too many packet-ins').set_function(
+            lambda: self.source_drops)
+        m.counter('ncis_flow_mods_total', 'FlowMods sent by the batcher').set_function(lambda: self.batcher.sent)
+        m.gauge('ncis_owned_switches', 'Datapaths this process is master of').set_function(
+            lambda: len(self.owned) if self.cluster is not None else len(self.datapaths))
+        m.gauge('ncis_cluster_members', 'Live controller processes').set_function(lambda: len(self.members))
+        m.counter('ncis_offload_dropped_total', 'Replies not handed to the detection workers').set_function(
+            lambda: self.detection_pool.dropped if self.detection_pool is not None else 0)
+        m.gauge('ncis_flow_table_entries', 'Active flow entries reported by the switch', ('dpid', 'table')).set_function(
+            lambda: {(dpid, table_id): count for dpid, tables in self.table_occupancy.items()
+                     for table_id, count in tables.items()})
+        m.counter('ncis_flow_evictions_total', 'L2 rules evicted from full tables').set_function(lambda: self.evictions)
+        self.handler_latency = m.histogram('ncis_handler_seconds', 'Event handler latency', ('handler',))
+        self.poll_rtt = m.histogram('ncis_stats_poll_rtt_seconds', 'Port stats request round-trip time', ('dpid',))
+
+    def _serve_metrics(self):
+        if self.metrics_port is None:
+            return
+        # green thread dell'hub: gli scrape non si sovrappongono ai gestori degli eventi
+        server = hub.WSGIServer(('0.0.0.0', self.metrics_port), self.metrics.wsgi_app)
+        self.logger.info('Metrics on port %d', server.server.getsockname()[1])
+        server.serve_forever()
 
     def _monitor(self):
         self.logger.info("Monitor thread started")
-        if os.path.exists('port_stats.csv'):
-            os.remove('port_stats.csv')
         while True:
-            for dp in self.datapaths.values():
-                self._request_stats(dp)
-            self._stats_csv() #?
-            time.sleep(2)
+            for dpid in self.poller.due(time.time()):
+                dp = self.datapaths.get(dpid)
+                if dp is not None:
+                    self._request_stats(dp)
+            self.poller.wait()
 
     def _limit_rate(self):
         self.logger.info("Mitigation thread started")
 
         while True:
+            expired = self.block_timers.pop_expired(time.time())
+            for key in expired:
+                self._expire_block(key)
+            if expired:
+                self.logger.debug('Blocklist: %s', self.blocklist)
 
-            for (dpid, port_no), count in list(self.blocklist.items()):
-                if count > 4:
-                    self._unblock_port(dpid, port_no)
-                    del self.blocklist[(dpid, port_no)]
-                else:
-                    self.blocklist[(dpid, port_no)] += 1
+            # dorme fino alla prossima scadenza (o finche' non ne arriva una piu' vicina)
+            self.block_timers.wait(max_wait=60)
+
+    def _expire_block(self, key):
+        # dal timer o dal FlowRemoved per hard timeout: chi arriva secondo non trova piu' nulla
+        if self.blocklist.pop(key, None) is not None:
+            self.block_timers.cancel(key)
+            self._notify_detection(UNBLOCKED, key)
+            self._unblock_port(*key)
+        elif self.flow_blocklist.pop(key, None) is not None:
+            self.block_timers.cancel(key)
+            self._unblock_flow(*key)
+
+    def _block_timeout(self, key, blocklist):
+        # secondi di blocco rimasti, come hard_timeout della regola (0: nessuna scadenza)
+        deadline = blocklist.get(key)
+        if deadline is None:
+            return 0
+        return max(int(math.ceil(deadline - time.time())), 1)
+
+    def _restore_state(self):
+        tables = self.state_log.load()
+        now = time.time()
+        for (dpid, mac), port_no in tables.get('mac', {}).items():
+            self.mac_to_port.setdefault(dpid, {})[mac] = port_no
+        for mac, location in tables.get('host', {}).items():
+            self.hosts[mac] = tuple(location)
+        for (dpid, port_no), (rx_bytes, tx_bytes, timestamp) in tables.get('port', {}).items():
+            self.port_stats.restore(dpid, port_no, rx_bytes, tx_bytes, timestamp)
+        self.watchlist.update(tables.get('watch', {}))
+        for key, (count, last) in tables.get('offence', {}).items():
+            self.offences[key] = (count, last)
+        # i blocchi scaduti durante il riavvio vengono tolti dalla riconciliazione
+        for table, blocklist in (('block', self.blocklist), ('flow_block', self.flow_blocklist)):
+            for key, deadline in tables.get(table, {}).items():
+                if deadline > now:
+                    blocklist[key] = deadline
+                    self.block_timers.schedule(key, deadline)
+                    if table == 'block':
+                        self._notify_detection(BLOCKED, key)
+        self.logger.info('Restored state: %d MACs, %d ports, %d blocks',
+                         len(tables.get('mac', {})), len(tables.get('port', {})), len(self.blocklist))
+
+    def _snapshot_loop(self):
+        if self.state_log is None:
+            return
+        while True:
+            hub.sleep(self.snapshot_interval)
+            self._save_state()
+
+    def _save_state(self):
+        # solo le differenze rispetto all'ultimo salvataggio finiscono nel log
+        log = self.state_log
+        log.sync('mac', {(dpid, mac): port_no for dpid, macs in self.mac_to_port.items()
+                         for mac, port_no in macs.items()})
+        log.sync('host', self.hosts)
+        store = self.port_stats
+        log.sync('port', {(dpid, port_no): (store.rx_bytes[slot], store.tx_bytes[slot], store.timestamp[slot])
+                          for dpid, ports in store.slots.items() for port_no, slot in ports.items()})
+        log.sync('watch', self.watchlist)
+        log.sync('offence', self.offences)
+        log.sync('block', self.blocklist)
+        log.sync('flow_block', self.flow_blocklist)
+        log.flush()
+
+    def _join_cluster(self):
+        now = time.time()
+        self.cluster.heartbeat(now)
+        self.members = self.cluster.members(now)
+        for kind, key, deadline in self.cluster.active_decisions(now):
+            self._apply_decision(kind, key, deadline)
+        self.logger.info('Node %s joined cluster %s: %s', self.node_id, self.cluster_path, self.members)
 
-            self.logger.info(f"Blocklist: {self.blocklist}")
-            time.sleep(5)
+    def _cluster_loop(self):
+        if self.cluster is None:
+            return
+        last_prune = 0
+        while True:
+            now = time.time()
+            self.cluster.heartbeat(now)
+            members = self.cluster.members(now)
+            if members != self.members:
+                self.logger.info('Cluster members: %s', members)
+                self.members = members
+                self._update_roles()
+            for kind, key, deadline in self.cluster.decisions(now):
+                self._apply_decision(kind, key, deadline)
+            if now - last_prune > 60:
+                self.cluster.prune(now)
+                last_prune = now
+            hub.sleep(self.heartbeat_interval)
+
+    def _owns(self, dpid):
+        return self.cluster is None or dpid in self.owned
+
+    def _assign_role(self, datapath):
+        # True se questo processo e' il MASTER dello switch
+        if self.cluster is None:
+            return True
+        dpid = datapath.id
+        master = rendezvous_owner(dpid, self.members) == self.node_id
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        role = ofproto.OFPCR_ROLE_MASTER if master else ofproto.OFPCR_ROLE_SLAVE
+        datapath.send_msg(parser.OFPRoleRequest(datapath, role, self.cluster.next_generation()))
+        if master:
+            self.owned.add(dpid)
+        else:
+            self.owned.discard(dpid)
+        return master
+
+    def _take_over(self, datapath):
+        # lo switch e' nostro: polling, riconciliazione dei blocchi e percorsi verso gli host noti
+        self.poller.add(datapath.id, time.time())
+        self._request_mitigation_rules(datapath)
+        if self.proactive_paths:
+            for mac in self.hosts:
+                self._install_host_paths(mac, [datapath.id])
+
+    def _update_roles(self):
+        for dpid, datapath in list(self.datapaths.items()):
+            owned = dpid in self.owned
+            if (rendezvous_owner(dpid, self.members) == self.node_id) == owned:
+                continue
+            if self._assign_role(datapath):
+                self.logger.info('Taking over datapath: %016x', dpid)
+                self._take_over(datapath)
+            else:
+                self.logger.info('Handing over datapath: %016x', dpid)
+                self.poller.remove(dpid)
+
+    def _apply_decision(self, kind, key, deadline):
+        if kind == 'host':
+            mac, dpid, port_no = key
+            if self.hosts.get(mac) != (dpid, port_no):
+                self.hosts[mac] = (dpid, port_no)
+                if self.proactive_paths:
+                    self._install_host_paths(mac)
+            return
+        blocklist = self.blocklist if kind == 'block' else self.flow_blocklist
+        if blocklist.get(key, 0) >= deadline:
+            return
+        blocklist[key] = deadline
+        self.block_timers.schedule(key, deadline)
+        # le regole le installa solo il MASTER dello switch
+        if kind == 'block':
+            self._notify_detection(BLOCKED, key)
+            self._block_port(*key)
+        else:
+            self._block_flow(*key)
+
+    def _schedule_unblock(self, key, blocklist=None):
+        now = time.time()
+        count, last = self.offences.get(key, (0, 0))
+        if now - last > self.offence_memory:
+            count = 0
+        duration = min(self.block_time * 2 ** count, self.max_block_time)
+        self.offences[key] = (count + 1, now)
+
+        blocklist = self.blocklist if blocklist is None else blocklist
+        blocklist[key] = now + duration
+        self.block_timers.schedule(key, now + duration + self.unblock_grace)
+        if self.cluster is not None:
+            self.cluster.publish('block' if blocklist is self.blocklist else 'flow_block', key, now + duration)
+        if blocklist is self.blocklist:
+            self._notify_detection(BLOCKED, key)
+        self.logger.info('%s blocked for %ds (offence %d)', key, duration, count + 1)
+
+    def _notify_detection(self, kind, key):
+        # i worker contano i blocchi per num_active_ports e non rimettono in watchlist le porte bloccate
+        if self.detection_pool is not None:
+            self.detection_pool.notify(kind, *key)
+
+    def _decision_loop(self):
+        pool = self.detection_pool
+        if pool is None:
+            return
+        while True:
+            records = pool.results(self.max_decisions)
+            for kind, port_no, dpid, value in records:
+                key = (dpid, port_no)
+                if kind == WATCH:
+                    self.watchlist[key] = int(value)
+                elif kind == ALARM:
+                    self.logger.warning('Allarme! Switch %s, Porta %s ha superato la soglia con throughput: RX=%f', dpid, port_no, value)
+                elif kind == ACTIVE:
+                    self.num_active_ports = int(value)
+                    if self.mitigation_mode == 'meter' and self.port_meters:
+                        self._retune_meters(dpid)
+                elif kind == BLOCK:
+                    if key not in self.blocklist:
+                        self._schedule_unblock(key)
+                    self._block_port(*key)
+            restarted = pool.check()
+            if restarted:
+                self.logger.warning('%d detection workers restarted', restarted)
+            # dopo max_decisions decisioni si cede subito l'hub agli altri gestori
+            hub.sleep(0 if len(records) >= self.max_decisions else self.decision_interval)
 
     def _block_port(self, dpid, port_no):
-        del self.watchlist[(dpid, port_no)]
-        self.logger.info(f'\nRIMUOVO Watchlist: {self.watchlist}\n')
-        datapath = self.datapaths[dpid]
+        self.watchlist.pop((dpid, port_no), None)
+        self.logger.debug('RIMUOVO Watchlist: %s', self.watchlist)
+        datapath = self.datapaths.get(dpid)
+        if datapath is None or not self._owns(dpid):
+            return
+        if self.mitigation_mode == 'meter':
+            self._limit_port(dpid, port_no)
+            return
         parser = datapath.ofproto_parser
 
         # Create a match for incoming traffic on the port
@@ -72,34 +501,124 @@ class SimpleSwitch13(app_manager.RyuApp):
         # Create an action to drop packets
         actions = []
 
-        self.add_flow(datapath, 2, match, actions)
+        self.add_flow(datapath, 2, match, actions, batch=True, table_id=MITIGATION_TABLE,
+                      hard_timeout=self._block_timeout((dpid, port_no), self.blocklist),
+                      flags=datapath.ofproto.OFPFF_SEND_FLOW_REM)
+
+        self.logger.info('Blocking port: Switch %s, Port %s, RX Throughput=%f', dpid, port_no, self.port_stats.get(dpid, port_no, 'rx_throughput'))
+
+    def _limit_port(self, dpid, port_no):
+        datapath = self.datapaths[dpid]
+        parser = datapath.ofproto_parser
+        rate = self._fair_share_kbps()
+
+        if (dpid, port_no) in self.port_meters:
+            self._set_meter(datapath, port_no, rate)
+            return
+
+        meter_id = self._alloc_meter_id(dpid)
+        self.port_meters[(dpid, port_no)] = [meter_id, None]
+        self._set_meter(datapath, port_no, rate)
+
+        # il traffico della porta passa dal meter e poi prosegue normalmente nella tabella L2
+        match = parser.OFPMatch(in_port=port_no)
+        self.add_flow(datapath, 2, match, [], batch=True, table_id=MITIGATION_TABLE,
+                      meter_id=meter_id, goto_table=L2_TABLE,
+                      hard_timeout=self._block_timeout((dpid, port_no), self.blocklist),
+                      flags=datapath.ofproto.OFPFF_SEND_FLOW_REM)
+
+        self.logger.info('Limiting port: Switch %s, Port %s to %d kbps, RX Throughput=%f', dpid, port_no, rate, self.port_stats.get(dpid, port_no, 'rx_throughput'))
+
+    def _alloc_meter_id(self, dpid):
+        # la tabella dei meter dello switch e' limitata: prima gli id gia' liberati
+        free = self.free_meter_ids.get(dpid)
+        if free:
+            return heapq.heappop(free)
+        meter_id = self.next_meter_id.get(dpid, TABLE_MISS_METER + 1)
+        self.next_meter_id[dpid] = meter_id + 1
+        return meter_id
+
+    def _delete_meter(self, datapath, meter_id):
+        # send_now: la DELETE arriva dopo quelle, gia' in coda, delle regole che usano il meter
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        self.batcher.send_now(datapath, parser.OFPMeterMod(datapath=datapath, command=ofproto.OFPMC_DELETE,
+                                                           meter_id=meter_id))
+        free = self.free_meter_ids.setdefault(datapath.id, [])
+        if meter_id not in free:
+            heapq.heappush(free, meter_id)
+        # anche gli id trovati sullo switch (di prima di un riavvio): next_meter_id non li riassegna
+        first_unused = self.next_meter_id.get(datapath.id, TABLE_MISS_METER + 1)
+        self.next_meter_id[datapath.id] = max(first_unused, meter_id + 1)
+
+    def _fair_share_kbps(self):
+        # final_threshold e' in byte/s, i meter in kbit/s
+        return max(int(final_threshold(self.threshold, self.num_active_ports) * 8 / 1000), 1)
 
-        out = parser.OFPPacketOut(datapath=datapath, buffer_id=0, in_port=port_no, actions=actions, data=None)
-        datapath.send_msg(out)
+    def _set_meter(self, datapath, port_no, rate):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        meter = self.port_meters[(datapath.id, port_no)]
+        if meter[1] == rate:
+            return
+        command = ofproto.OFPMC_ADD if meter[1] is None else ofproto.OFPMC_MODIFY
+        if self.meter_band == 'dscp':
+            bands = [parser.OFPMeterBandDscpRemark(rate=rate, burst_size=rate // 10, prec_level=1)]
+        else:
+            bands = [parser.OFPMeterBandDrop(rate=rate, burst_size=rate // 10)]
+        self.batcher.send_now(datapath, parser.OFPMeterMod(datapath=datapath, command=command,
+                                                           flags=ofproto.OFPMF_KBPS | ofproto.OFPMF_BURST,
+                                                           meter_id=meter[0], bands=bands))
+        meter[1] = rate
 
-        self.logger.info('Blocking port: Switch %s, Port %s, RX Throughput=%f', dpid, port_no, self.port_stats[dpid][port_no].get('rx_throughput', 0))
+    def _retune_meters(self, dpid):
+        # la quota equa cambia con il numero di porte attive
+        datapath = self.datapaths.get(dpid)
+        if datapath is None:
+            return
+        rate = self._fair_share_kbps()
+        for (meter_dpid, port_no) in self.port_meters:
+            if meter_dpid == dpid:
+                self._set_meter(datapath, port_no, rate)
 
     def _unblock_port(self, dpid, port_no):
         self.logger.info('Unblocking port: Switch %s, Port %s', dpid, port_no)
 
         # Remove the flow entry that drops packets
-        datapath = self.datapaths[dpid]
+        datapath = self.datapaths.get(dpid)
+        if datapath is None or not self._owns(dpid):
+            self.port_meters.pop((dpid, port_no), None)
+            return
         parser = datapath.ofproto_parser
         match = parser.OFPMatch(in_port=port_no)
-        self.remove_flow(datapath, match)
+        # strict: i blocchi per flusso e i drop delle sorgenti sulla stessa porta restano
+        self.remove_flow(datapath, match, batch=True, table_id=MITIGATION_TABLE, priority=2)
+
+        meter = self.port_meters.pop((dpid, port_no), None)
+        if meter is not None:
+            self._delete_meter(datapath, meter[0])
 
-    def remove_flow(self, datapath, match):
+    def remove_flow(self, datapath, match, batch=False, table_id=0, priority=None):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
+        # con priority si cancella solo la regola con esattamente questo match
         mod = parser.OFPFlowMod(
             datapath=datapath,
-            command=ofproto.OFPFC_DELETE,
+            table_id=table_id,
+            command=ofproto.OFPFC_DELETE if priority is None else ofproto.OFPFC_DELETE_STRICT,
+            priority=priority or 0,
             out_port=ofproto.OFPP_ANY,
             out_group=ofproto.OFPG_ANY,
             match=match
         )
-        datapath.send_msg(mod)
+        self._send_flow_mod(datapath, mod, batch)
+
+    def _send_flow_mod(self, datapath, mod, batch):
+        if batch:
+            self.batcher.queue(datapath, mod)
+        else:
+            self.batcher.send_now(datapath, mod)
 
     def _request_stats(self, datapath):
         self.logger.debug('send stats request: %016x', datapath.id)
@@ -109,6 +628,20 @@ class SimpleSwitch13(app_manager.RyuApp):
         req = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
         datapath.send_msg(req)
 
+        # occupazione delle tabelle, per le metriche e l'eviction
+        datapath.send_msg(parser.OFPTableStatsRequest(datapath, 0))
+
+        if self.flow_detection:
+            req = parser.OFPFlowStatsRequest(datapath, table_id=L2_TABLE)
+            datapath.send_msg(req)
+
+    def _update_active_port(self, dpid, port_no, throughput):
+        # aggiornamento incrementale: O(1) per porta invece di riscandire lo switch
+        if throughput > self.lower_threshold:
+            self.active_ports[dpid].add(port_no)
+        else:
+            self.active_ports[dpid].discard(port_no)
+
     @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, CONFIG_DISPATCHER])
     def _state_change_handler(self, ev):
         datapath = ev.datapath
@@ -116,77 +649,292 @@ class SimpleSwitch13(app_manager.RyuApp):
             if datapath.id not in self.datapaths:
                 self.logger.info('Register datapath: %016x', datapath.id)
                 self.datapaths[datapath.id] = datapath
+                if self._assign_role(datapath):
+                    self._take_over(datapath)
         elif ev.state == 'DEAD_DISPATCHER':
             if datapath.id in self.datapaths:
                 self.logger.info('Unregister datapath: %016x', datapath.id)
                 del self.datapaths[datapath.id]
+                self.owned.discard(datapath.id)
+                self.l2_rules.pop(datapath.id, None)
+                self.l2_dst_rules.pop(datapath.id, None)
+                self.table_occupancy.pop(datapath.id, None)
+                self.flow_bytes.pop(datapath.id, None)
+                self.flow_reply.pop(datapath.id, None)
+                # alla riconnessione _limit_port deve reinstallare meter e regola (lo switch puo'
+                # averli persi); gli id restano occupati, next_meter_id non torna indietro
+                for key in [key for key in self.port_meters if key[0] == datapath.id]:
+                    del self.port_meters[key]
+                self.poller.remove(datapath.id)
+
+    def _request_mitigation_rules(self, datapath):
+        parser = datapath.ofproto_parser
+        req = parser.OFPFlowStatsRequest(datapath, table_id=MITIGATION_TABLE)
+        datapath.set_xid(req)
+        self.reconcile_xids[datapath.id] = req.xid
+        self.reconcile_rules[datapath.id] = []
+        datapath.send_msg(req)
+
+    def _reconcile(self, msg):
+        # confronta le regole di mitigazione rimaste sullo switch (ad esempio da prima di
+        # un riavvio) con blocklist e flow_blocklist
+        datapath = msg.datapath
+        dpid = datapath.id
+        self.reconcile_rules[dpid] += msg.body
+        if msg.flags & ofproto_v1_3.OFPMPF_REPLY_MORE:
+            return
+        del self.reconcile_xids[dpid]
+        rules = self.reconcile_rules.pop(dpid)
+        parser = datapath.ofproto_parser
+
+        stale = 0
+        meter_ids = []
+        for stat in rules:
+            match = stat.match
+            if stat.priority == 2 and 'in_port' in match:
+                # i meter trovati (anche di prima di un riavvio) si cancellano con le loro
+                # regole e i blocchi ancora validi vengono reinstallati sotto con meter nuovi
+                meters = [inst.meter_id for inst in stat.instructions if isinstance(inst, parser.OFPInstructionMeter)]
+                meter_ids += meters
+                if meters or (dpid, match['in_port']) not in self.blocklist:
+                    self.remove_flow(datapath, match, batch=True, table_id=MITIGATION_TABLE, priority=2)
+                if (dpid, match['in_port']) not in self.blocklist:
+                    stale += 1
+            elif stat.priority == 3 and 'eth_dst' in match:
+                key = (dpid, match['in_port'], match['eth_src'], match['eth_dst'])
+                if key not in self.flow_blocklist:
+                    self.remove_flow(datapath, match, batch=True, table_id=MITIGATION_TABLE, priority=3)
+                    stale += 1
+
+        # le DELETE dei meter partono dopo quelle delle regole, gia' in coda; gli id tornano liberi
+        for meter_id in meter_ids:
+            for key, meter in list(self.port_meters.items()):
+                if key[0] == dpid and meter[0] == meter_id:
+                    del self.port_meters[key]
+            self._delete_meter(datapath, meter_id)
+
+        # una ADD identica sostituisce la regola esistente: si reinstallano tutti i blocchi validi
+        blocked = [key for key in self.blocklist if key[0] == dpid]
+        for key in blocked:
+            self._block_port(*key)
+        for key in self.flow_blocklist:
+            if key[0] == dpid:
+                self._block_flow(*key)
+        self.logger.info('Switch %s reconciled: %d stale rules removed, %d blocks restored', dpid, stale, len(blocked))
+
+    @set_ev_cls(topo_event.EventLinkAdd)
+    def _link_add_handler(self, ev):
+        src, dst = ev.link.src, ev.link.dst
+        self.graph.add_link(src.dpid, src.port_no, dst.dpid, dst.port_no)
+
+    @set_ev_cls(topo_event.EventLinkDelete)
+    def _link_delete_handler(self, ev):
+        src, dst = ev.link.src, ev.link.dst
+        self.graph.remove_link(src.dpid, src.port_no, dst.dpid, dst.port_no)
 
     @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    @timed('port_stats_reply')
     def _port_stats_reply_handler(self, ev):
         body = ev.msg.body
         datapath = ev.msg.datapath
         dpid = datapath.id
 
-        self.port_stats.setdefault(dpid, {})
+        self.active_ports.setdefault(dpid, set())
+
+        # Skip special port numbers
+        body = [stat for stat in body if stat.port_no < ofproto_v1_3.OFPP_MAX]
+        port_nos = [stat.port_no for stat in body]
+        rx_bytes = [stat.rx_bytes for stat in body]
+        tx_bytes = [stat.tx_bytes for stat in body]
+        now = time.time()
+        new_ports, rates = self.port_stats.update(dpid, port_nos, rx_bytes, tx_bytes, now)
+        changed = new_ports + [port_no for port_no, _, _, moved in rates if moved]
+
+        if self.detection_pool is not None:
+            # la rilevazione la fanno i worker: qui solo i contatori grezzi nel ring
+            self.detection_pool.submit(dpid, port_nos, rx_bytes, tx_bytes, now)
+            for port_no, rx_throughput, tx_throughput, _ in rates:
+                self._update_active_port(dpid, port_no, rx_throughput + tx_throughput)
+        elif rates:
+            self._evaluate_reply(dpid, rates)
+
+        if changed:
+            self._write_stats(dpid, changed)
+
+        # una reply multipart puo' arrivare in piu' messaggi
+        if not ev.msg.flags & ofproto_v1_3.OFPMPF_REPLY_MORE:
+            sent = self.poller.replied(dpid)
+            if sent is not None:
+                self.poll_rtt.observe(time.time() - sent, (dpid,))
+            self._update_poll_rate(dpid)
 
-        for stat in body:
-            port_no = stat.port_no
+    def _evaluate_reply(self, dpid, rates):
+        # Tutta la reply in un passo: stesso timestamp, stesso numero di porte attive
+        port_nos = [r[0] for r in rates]
+        rx_rates = self._detection_rates(dpid, rates)
+        self.num_active_ports = len(self.active_ports[dpid]) - 1 - len(self.blocklist)
 
+        alarms, watch_updates, blocks = evaluate_reply(dpid, port_nos, rx_rates, self.num_active_ports,
+                                                       self.threshold, self.watchlist, self.blocklist,
+                                                       monitored=self.mitigation_scope == 'local' and dpid in self.monitored_dpids,
+                                                       watch_limit=self.watch_limit)
 
-            # Skip special port numbers
-            if port_no >= ofproto_v1_3.OFPP_MAX:
+        for port_no, rx_throughput in alarms:
+            self.logger.warning('Allarme! Switch %s, Porta %s ha superato la soglia con throughput: RX=%f', dpid, port_no, rx_throughput)
+        if watch_updates:
+            self.watchlist.update(watch_updates)
+            if alarms:
+                self.logger.debug('AGGIUNGO Watchlist: %s', self.watchlist)
+        for key in blocks:
+            if key not in self.blocklist:
+                self._schedule_unblock(key)
+            self._block_port(*key)
+
+        if self.mitigation_scope == 'network':
+            self._evaluate_network(dpid)
+
+        if self.mitigation_mode == 'meter' and self.port_meters:
+            self._retune_meters(dpid)
+
+        for port_no, rx_throughput, tx_throughput, _ in rates:
+            self._update_active_port(dpid, port_no, rx_throughput + tx_throughput)
+
+    def _evaluate_network(self, dpid):
+        # solo i link in uscita da questo switch: il costo per reply resta proporzionale
+        # ai suoi link e alle porte di accesso a monte di quelli congestionati
+        graph = self.graph
+        store = self.port_stats
+        for port_no in store.port_nos(dpid):
+            if graph.is_edge_port(dpid, port_no):
+                continue
+            capacity = graph.capacity.get((dpid, port_no), self.default_link_capacity)
+            if store.get(dpid, port_no, 'tx_throughput') < self.congestion_ratio * capacity:
                 continue
 
+            ingress = {}
+            for sw in graph.upstream(dpid, port_no):
+                for p in store.port_nos(sw):
+                    if graph.is_edge_port(sw, p) and (sw, p) not in self.blocklist:
+                        ingress[(sw, p)] = self._port_rate(sw, p)
+            share, offenders = attribute_congestion(capacity, ingress, self.lower_threshold)
+            if not offenders:
+                continue
+            self.logger.warning('Allarme! Link Switch %s, Porta %s congestionato, quota equa %f: %s', dpid, port_no, share, offenders)
 
-            if port_no not in self.port_stats[dpid]:
-                self.port_stats[dpid][port_no] = {
-                    'rx_bytes': stat.rx_bytes,
-                    'tx_bytes': stat.tx_bytes,
-                    'timestamp': time.time()
-                }
-            else:
-                prev_stats = self.port_stats[dpid][port_no]
-                curr_time = time.time()
-                time_diff = curr_time - prev_stats['timestamp']
+            for key in ingress:
+                count = self.watchlist.get(key)
+                if key in offenders:
+                    self.watchlist[key] = 0 if count is None else count + 1
+                elif count:
+                    self.watchlist[key] = count - 1
+            for key in offenders:
+                if self.watchlist[key] > self.watch_limit:
+                    self._schedule_unblock(key)
+                    self._block_port(*key)
+
+    def _port_rate(self, dpid, port_no):
+        slot = self.port_stats.slots.get(dpid, {}).get(port_no)
+        if slot is None:
+            return 0.0
+        if self.detection_rate == 'raw':
+            return self.port_stats.rx_throughput[slot]
+        return self.rx_rates.estimate(slot, self.detection_rate)
 
-                rx_throughput = (stat.rx_bytes - prev_stats['rx_bytes']) / time_diff
-                tx_throughput = (stat.tx_bytes - prev_stats['tx_bytes']) / time_diff
+    def _detection_rates(self, dpid, rates):
+        slots = self.port_stats.slots[dpid]
+        estimator = self.rx_rates
+        smoothed = [estimator.add(slots[port_no], rx) for port_no, rx, _, _ in rates]
+        if self.detection_rate == 'ewma':
+            return smoothed
+        if self.detection_rate == 'raw':
+            return [r[1] for r in rates]
+        return [estimator.estimate(slots[r[0]], self.detection_rate) for r in rates]
 
-                #self.logger.info('Switch %s, Porta %s - RX Throughput: %f bytes/sec, TX Throughput: %f bytes/sec', dpid, port_no, rx_throughput, tx_throughput)
+    def port_rate_stats(self, dpid, port_no):
+        # ewma, min, max e p95 della finestra RX di una porta
+        slot = self.port_stats.slots.get(dpid, {}).get(port_no)
+        if slot is None:
+            return None
+        return self.rx_rates.stats(slot)
 
-                self.active_ports = [p for p in self.port_stats[dpid] if (self.port_stats[dpid][p].get('rx_throughput', 0)+self.port_stats[dpid][p].get('tx_throughput', 0)) > self.lower_threshold]
-                self.num_active_ports = len(self.active_ports) - 1 - len(self.blocklist)
+    def _update_poll_rate(self, dpid):
+        hot = any((dpid, p) in self.watchlist for p in self.port_stats.port_nos(dpid)) or \
+            max(self.port_stats.column(dpid, 'rx_throughput'), default=0) >= self.hot_ratio * self.threshold
+        idle = not hot and not self.active_ports[dpid]
+        self.poller.update(dpid, hot, idle, time.time())
+        self.logger.debug('Switch %s poll rate: %.2f req/s', dpid, self.poller.poll_rate(dpid))
 
-                if dpid == 3:
-                    if rx_throughput > self.threshold and self.num_active_ports > 1:
-                        self.logger.warning('Allarme! Switch %s, Porta %s ha superato la soglia con throughput: RX=%f', dpid, port_no, rx_throughput)
-                        if (dpid, port_no) not in self.watchlist and (dpid, port_no) not in self.blocklist:
-                            self.watchlist[(dpid, port_no)] = 0
-                        elif (dpid, port_no) in self.watchlist:
-                            self.watchlist[(dpid, port_no)] += 1
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    @timed('flow_stats_reply')
+    def _flow_stats_reply_handler(self, ev):
+        dpid = ev.msg.datapath.id
+        if self.reconcile_xids.get(dpid) == ev.msg.xid:
+            self._reconcile(ev.msg)
+            return
+        if not self.flow_detection:
+            return
+        previous = self.flow_bytes.get(dpid, {})
+        current = self.flow_reply.setdefault(dpid, {})
 
-                        self.logger.info(f'\n AGGIUNGO Watchlist: {self.watchlist}\n')
-                    elif rx_throughput < self.threshold:
-                        if (dpid, port_no) in self.watchlist:
-                            if self.watchlist[(dpid, port_no)] > 0:
-                                self.watchlist[(dpid, port_no)] -= 1
+        for stat in ev.msg.body:
+            match = stat.match
+            if stat.priority != 1 or 'eth_src' not in match or 'in_port' not in match:
+                continue
+            in_port = match['in_port']
+            # si contano i flussi solo dove entrano nella rete: li' si blocca
+            if dpid in self.graph and not self.graph.is_edge_port(dpid, in_port):
+                continue
+            key = (dpid, in_port, match['eth_src'], match['eth_dst'])
+            current[key] = stat.byte_count
+            last = previous.get(key)
+            if last is None:
+                # flusso mai visto: fa da base, i byte di tutta la sua vita non sono un delta
+                continue
+            delta = stat.byte_count - last
+            if delta > 0:
+                self.flow_sketch.add(key, delta)
+                self.top_flows.add(key, delta)
 
-                # Calculate the final threshold based on the number of active ports
-                final_threshold = (self.threshold + self.threshold * 0.1) / self.num_active_ports if self.num_active_ports > 1 else 10000000
+        # la base si sostituisce solo a reply completa, con i flussi di tutte le parti:
+        # restano solo quelli ancora installati, quindi la memoria resta limitata
+        if ev.msg.flags & ofproto_v1_3.OFPMPF_REPLY_MORE:
+            return
+        self.flow_bytes[dpid] = self.flow_reply.pop(dpid)
 
-                if (dpid, port_no) in self.watchlist:
-                    if rx_throughput > final_threshold and self.watchlist[(dpid, port_no)] > 1:
-                        if (dpid, port_no) not in self.blocklist:
-                            self.blocklist[(dpid, port_no)] = 0
+        now = time.time()
+        if now - self.flow_window_start >= self.flow_window:
+            self._evaluate_flows(now)
 
-                        self._block_port(dpid, port_no)
+    def _evaluate_flows(self, now):
+        elapsed = now - self.flow_window_start
+        for key, _ in self.top_flows.top():
+            rate = self.flow_sketch.estimate(key) / elapsed
+            if rate > self.flow_threshold and key not in self.flow_blocklist:
+                self.logger.warning('Allarme! Flusso %s -> %s su Switch %s, Porta %s: %f byte/s', key[2], key[3], key[0], key[1], rate)
+                self._schedule_unblock(key, self.flow_blocklist)
+                self._block_flow(*key)
+        self.flow_sketch.clear()
+        self.top_flows.clear()
+        self.flow_window_start = now
 
+    def _block_flow(self, dpid, in_port, src, dst):
+        datapath = self.datapaths.get(dpid)
+        if datapath is None or not self._owns(dpid):
+            return
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
+        self.add_flow(datapath, 3, match, [], batch=True, table_id=MITIGATION_TABLE,
+                      hard_timeout=self._block_timeout((dpid, in_port, src, dst), self.flow_blocklist),
+                      flags=datapath.ofproto.OFPFF_SEND_FLOW_REM)
 
-                self.port_stats[dpid][port_no]['rx_bytes'] = stat.rx_bytes
-                self.port_stats[dpid][port_no]['tx_bytes'] = stat.tx_bytes
-                self.port_stats[dpid][port_no]['timestamp'] = curr_time
-                self.port_stats[dpid][port_no]['rx_throughput'] = rx_throughput
-                self.port_stats[dpid][port_no]['tx_throughput'] = tx_throughput
+    def _unblock_flow(self, dpid, in_port, src, dst):
+        self.logger.info('Unblocking flow %s -> %s: Switch %s, Port %s', src, dst, dpid, in_port)
+        datapath = self.datapaths.get(dpid)
+        if datapath is None or not self._owns(dpid):
+            return
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
+        self.remove_flow(datapath, match, batch=True, table_id=MITIGATION_TABLE)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -195,26 +943,139 @@ class SimpleSwitch13(app_manager.RyuApp):
         parser = datapath.ofproto_parser
 
         match = parser.OFPMatch()
+        self.add_flow(datapath, 0, match, [], table_id=MITIGATION_TABLE, goto_table=L2_TABLE)
+
+        # prima la table-miss senza meter: uno switch che non supporta i meter
+        # rifiuterebbe anche la regola che ne usa uno, e non manderebbe piu' packet-in
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
                                           ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
+        self.add_flow(datapath, 0, match, actions, table_id=L2_TABLE)
+
+        if self.table_miss_rate:
+            datapath.send_msg(parser.OFPMeterFeaturesStatsRequest(datapath, 0))
 
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
+    @set_ev_cls(ofp_event.EventOFPMeterFeaturesStatsReply, MAIN_DISPATCHER)
+    def _meter_features_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        supported = any(stat.max_meter > 0 and stat.band_types & (1 << ofproto.OFPMBT_DROP) and
+                        stat.capabilities & ofproto.OFPMF_PKTPS for stat in ev.msg.body)
+        if not supported:
+            self.logger.info('Switch %s has no packet rate meters: table-miss not limited', datapath.id)
+            return
+
+        # Il meter scarta sullo switch i pacchetti table-miss oltre table_miss_rate
+        bands = [parser.OFPMeterBandDrop(rate=self.table_miss_rate, burst_size=self.table_miss_rate // 10)]
+        meter = parser.OFPMeterMod(datapath=datapath, command=ofproto.OFPMC_ADD,
+                                   flags=ofproto.OFPMF_PKTPS | ofproto.OFPMF_BURST,
+                                   meter_id=TABLE_MISS_METER, bands=bands)
+        self.batcher.send_now(datapath, meter)
+
+        # stessa regola della table-miss senza meter: la ADD la sostituisce
+        match = parser.OFPMatch()
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+                                          ofproto.OFPCML_NO_BUFFER)]
+        self.add_flow(datapath, 0, match, actions, meter_id=TABLE_MISS_METER, table_id=L2_TABLE)
+
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, batch=False,
+                 meter_id=None, hard_timeout=0, table_id=0, goto_table=None, idle_timeout=0, flags=0):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
-                                             actions)]
+        inst = []
+        if meter_id is not None:
+            inst.append(parser.OFPInstructionMeter(meter_id, ofproto.OFPIT_METER))
+        if actions or goto_table is None:
+            inst.append(parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                                     actions))
+        if goto_table is not None:
+            inst.append(parser.OFPInstructionGotoTable(goto_table))
         if buffer_id:
             mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
                                     priority=priority, match=match,
-                                    instructions=inst)
+                                    instructions=inst, hard_timeout=hard_timeout,
+                                    idle_timeout=idle_timeout, flags=flags,
+                                    table_id=table_id)
         else:
             mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
-                                    match=match, instructions=inst)
-        datapath.send_msg(mod)
+                                    match=match, instructions=inst,
+                                    hard_timeout=hard_timeout, idle_timeout=idle_timeout,
+                                    flags=flags, table_id=table_id)
+        # un FlowMod con buffer_id rilascia un pacchetto: non si accoda
+        self._send_flow_mod(datapath, mod, batch and not buffer_id)
+
+    def _add_l2_flow(self, datapath, key, match, actions, buffer_id=None, batch=False):
+        # key: (in_port, src, dst), oppure (None, None, dst) per le regole proattive
+        rules = self.l2_rules.setdefault(datapath.id, OrderedDict())
+        if key in rules:
+            rules.move_to_end(key)
+        else:
+            rules[key] = None
+            counts = self.l2_dst_rules.setdefault(datapath.id, {})
+            counts[key[2]] = counts.get(key[2], 0) + 1
+        self.add_flow(datapath, 1, match, actions, buffer_id, batch=batch, table_id=L2_TABLE,
+                      idle_timeout=self.flow_idle_timeout, hard_timeout=self.flow_hard_timeout,
+                      flags=datapath.ofproto.OFPFF_SEND_FLOW_REM)
+
+    def _forget_l2_rule(self, dpid, key):
+        rules = self.l2_rules.get(dpid)
+        if rules is None or key not in rules:
+            return
+        del rules[key]
+        counts = self.l2_dst_rules[dpid]
+        counts[key[2]] -= 1
+        if not counts[key[2]]:
+            # nessuna regola porta piu' verso dst: la sua porta su questo switch va reimparata
+            del counts[key[2]]
+            self.mac_to_port.get(dpid, {}).pop(key[2], None)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def _flow_removed_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        ofproto = msg.datapath.ofproto
+        match = msg.match
+        if msg.table_id == L2_TABLE and 'eth_dst' in match:
+            self._forget_l2_rule(dpid, (match.get('in_port'), match.get('eth_src'), match['eth_dst']))
+        elif msg.table_id == MITIGATION_TABLE and msg.reason == ofproto.OFPRR_HARD_TIMEOUT:
+            if msg.priority == 2 and 'in_port' in match:
+                self._expire_block((dpid, match['in_port']))
+            elif msg.priority == 3 and 'eth_dst' in match:
+                self._expire_block((dpid, match['in_port'], match['eth_src'], match['eth_dst']))
+
+    @set_ev_cls(ofp_event.EventOFPTableStatsReply, MAIN_DISPATCHER)
+    def _table_stats_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        occupancy = self.table_occupancy.setdefault(datapath.id, {})
+        for stat in ev.msg.body:
+            if stat.table_id in (MITIGATION_TABLE, L2_TABLE):
+                occupancy[stat.table_id] = stat.active_count
+        used = occupancy.get(L2_TABLE, 0)
+        if used >= self.eviction_high * self.flow_table_size:
+            self._evict(datapath, used - int(self.eviction_low * self.flow_table_size))
+
+    def _evict(self, datapath, n):
+        rules = self.l2_rules.get(datapath.id)
+        if not rules or n <= 0:
+            return
+        # prima le regole reattive meno recenti, le proattive (una per host) solo se non bastano
+        victims = [key for key in rules if key[0] is not None][:n]
+        if len(victims) < n:
+            victims += [key for key in rules if key[0] is None][:n - len(victims)]
+        parser = datapath.ofproto_parser
+        for in_port, src, dst in victims:
+            if in_port is None:
+                match = parser.OFPMatch(eth_dst=dst)
+            else:
+                match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
+            self.remove_flow(datapath, match, batch=True, table_id=L2_TABLE, priority=1)
+            self._forget_l2_rule(datapath.id, (in_port, src, dst))
+        self.evictions += len(victims)
+        self.logger.info('Switch %s flow table nearly full: evicted %d rules', datapath.id, len(victims))
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    @timed('packet_in')
     def _packet_in_handler(self, ev):
         if ev.msg.msg_len < ev.msg.total_len:
             self.logger.debug("packet truncated: only %s of %s bytes",
@@ -224,65 +1085,125 @@ class SimpleSwitch13(app_manager.RyuApp):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         in_port = msg.match['in_port']
+        dpid = datapath.id
+        now = time.time()
+
+        # prima i controlli che non richiedono di leggere il pacchetto
+        if not self.switch_packet_in_limit.allow(dpid, now) or \
+                not self.port_packet_in_limit.allow((dpid, in_port), now):
+            self.packet_in_dropped += 1
+            return
 
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        header = None if self.deep_inspection else parse_eth(msg.data)
+        if header is not None:
+            self.fast_path_hits += 1
+            dst, src, ethertype = header
+        else:
+            self.slow_path_hits += 1
+            pkt = packet.Packet(msg.data)
+            eth = pkt.get_protocols(ethernet.ethernet)[0]
+            dst, src, ethertype = eth.dst, eth.src, eth.ethertype
 
-        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
+        if ethertype == ether_types.ETH_TYPE_LLDP:
             return
-        dst = eth.dst
-        src = eth.src
 
-        dpid = datapath.id
+        if not self.source_packet_in_limit.allow((dpid, in_port, src), now):
+            self.packet_in_dropped += 1
+            self._drop_source(datapath, in_port, src)
+            return
+        self.packet_in_accepted += 1
+
         self.mac_to_port.setdefault(dpid, {})
 
         #self.logger.info("packet in %s %s %s %s", dpid, src, dst, in_port)
 
         self.mac_to_port[dpid][src] = in_port
 
-        if dst in self.mac_to_port[dpid]:
-            out_port = self.mac_to_port[dpid][dst]
+        out_port = None
+        if self.proactive_paths and not self.flow_detection and dpid in self.graph:
+            out_port = self._proactive_out_port(dpid, in_port, src, dst)
+
+        if out_port is not None:
+            # la regola per dst c'e' (o e' appena stata reinstallata): basta inoltrare questo pacchetto
+            actions = [parser.OFPActionOutput(out_port)]
         else:
-            out_port = ofproto.OFPP_FLOOD
+            if dst in self.mac_to_port[dpid]:
+                out_port = self.mac_to_port[dpid][dst]
+            else:
+                out_port = ofproto.OFPP_FLOOD
 
-        actions = [parser.OFPActionOutput(out_port)]
+            actions = [parser.OFPActionOutput(out_port)]
 
-        if out_port != ofproto.OFPP_FLOOD:
-            match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
-            if msg.buffer_id != ofproto.OFP_NO_BUFFER:
-                self.add_flow(datapath, 1, match, actions, msg.buffer_id)
-                return
-            else:
-                self.add_flow(datapath, 1, match, actions)
+            if out_port != ofproto.OFPP_FLOOD:
+                match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
+                if msg.buffer_id != ofproto.OFP_NO_BUFFER:
+                    self._add_l2_flow(datapath, (in_port, src, dst), match, actions, msg.buffer_id)
+                    return
+                else:
+                    self._add_l2_flow(datapath, (in_port, src, dst), match, actions)
         data = None
         if msg.buffer_id == ofproto.OFP_NO_BUFFER:
             data = msg.data
 
         out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
                                   in_port=in_port, actions=actions, data=data)
-        datapath.send_msg(out)
-
-    def _stats_csv(self):
-        file_exists = os.path.isfile('port_stats.csv')
-        with open('port_stats.csv', mode='a') as csv_file:
-            fieldnames = ['timestamp', 'dpid', 'port_no', 'rx_bytes', 'tx_bytes', 'rx_throughput', 'tx_throughput', 'num_active_ports', 'active_ports', 'blocklist']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-
-            if not file_exists:
-                writer.writeheader()
-
-            for dpid, ports in self.port_stats.items():
-                for port_no, stats in ports.items():
-                    human_readable_timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['timestamp']))
-                    writer.writerow({
-                        'timestamp': human_readable_timestamp,
-                        'dpid': dpid,
-                        'port_no': port_no,
-                        'rx_bytes': stats['rx_bytes'],
-                        'tx_bytes': stats['tx_bytes'],
-                        'rx_throughput': stats.get('rx_throughput', 0),
-                        'tx_throughput': stats.get('tx_throughput', 0),
-                        'num_active_ports': self.num_active_ports,
-                        'active_ports': self.active_ports,
-                        'blocklist': self.blocklist
-                    })
+        self.batcher.send_now(datapath, out)
+
+    def _drop_source(self, datapath, in_port, src):
+        # regola temporanea: lo switch la rimuove da solo allo scadere dell'hard_timeout
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(in_port=in_port, eth_src=src)
+        self.add_flow(datapath, 3, match, [], batch=True, hard_timeout=self.source_drop_time,
+                      table_id=MITIGATION_TABLE)
+        self.source_packet_in_limit.forget((datapath.id, in_port, src))
+        self.source_drops += 1
+        self.logger.info('Too many packet-in from %s on Switch %s, Port %s: dropping for %ss',
+                         src, datapath.id, in_port, self.source_drop_time)
+
+    def _proactive_out_port(self, dpid, in_port, src, dst):
+        # gli host si imparano solo sulle porte di accesso, non sui link tra switch
+        if self.graph.is_edge_port(dpid, in_port) and self.hosts.get(src) != (dpid, in_port):
+            self.hosts[src] = (dpid, in_port)
+            self._install_host_paths(src)
+            if self.cluster is not None:
+                # gli altri processi installano i percorsi sui loro switch
+                self.cluster.publish('host', (src, dpid, in_port), time.time() + self.cluster.decision_ttl)
+
+        if dst not in self.hosts:
+            return None
+        out_port = self.graph.next_hops(*self.hosts[dst]).get(dpid)
+        if out_port is None or out_port == in_port:
+            return None
+        if (None, None, dst) not in self.l2_rules.get(dpid, ()):
+            # la regola verso dst e' scaduta (idle/hard timeout) o e' stata tolta dall'eviction
+            self._install_host_paths(dst, [dpid])
+        return out_port
+
+    def _install_host_paths(self, mac, dpids=None):
+        # una regola con solo eth_dst per switch: vale per qualunque sorgente
+        tree = self.graph.next_hops(*self.hosts[mac])
+        for dpid in (dpids if dpids is not None else tree):
+            datapath = self.datapaths.get(dpid)
+            if datapath is None or dpid not in tree or not self._owns(dpid):
+                continue
+            parser = datapath.ofproto_parser
+            match = parser.OFPMatch(eth_dst=mac)
+            actions = [parser.OFPActionOutput(tree[dpid])]
+            self._add_l2_flow(datapath, (None, None, mac), match, actions, batch=True)
+        self.logger.debug('Installed paths towards %s on %d switches', mac, len(tree))
+
+    def _write_stats(self, dpid, changed):
+        # Solo le porte cambiate in questa reply; active_ports e blocklist
+        # vengono convertiti in stringa una volta per reply, non per riga
+        active_ports = str(sorted(self.active_ports[dpid]))
+        blocklist = str(self.blocklist)
+        store = self.port_stats
+        slots = store.slots[dpid]
+        rows = []
+        for port_no in changed:
+            slot = slots[port_no]
+            rows.append((store.timestamp[slot], dpid, port_no, store.rx_bytes[slot], store.tx_bytes[slot],
+                         store.rx_throughput[slot], store.tx_throughput[slot],
+                         self.num_active_ports, active_ports, blocklist))
+        for sink in self.stats_sinks:
+            sink.write(rows)
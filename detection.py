@@ -0,0 +1,66 @@
+BLOCK_MARGIN = 0.1 # la soglia finale concede il 10% in piu' della quota equa
+NO_LIMIT = 10000000
+
+
+def final_threshold(threshold, num_active_ports):
+    # Calculate the final threshold based on the number of active ports
+    return (threshold + threshold * BLOCK_MARGIN) / num_active_ports if num_active_ports > 1 else NO_LIMIT
+
+
+def evaluate_reply(dpid, port_nos, rx_rates, num_active_ports, threshold, watchlist, blocklist, monitored=True,
+                   watch_limit=1):
+    """Evaluate the detection policy for a whole reply of one datapath.
+
+    port_nos and rx_rates are parallel sequences; num_active_ports is read
+    once for the whole reply. watchlist and blocklist are only read: the
+    caller applies the returned transitions. A watched port is blocked once
+    its counter exceeds watch_limit.
+
+    Returns (alarms, watch_updates, blocks): the (port_no, rx) pairs above
+    threshold, the new watchlist counters by (dpid, port_no) and the
+    (dpid, port_no) keys to block.
+    """
+    if monitored:
+        over = [rx > threshold for rx in rx_rates] if num_active_ports > 1 else [False] * len(rx_rates)
+        under = [rx < threshold for rx in rx_rates]
+    else:
+        over = under = [False] * len(rx_rates)
+
+    alarms = []
+    watch_updates = {}
+    for port_no, rx, is_over, is_under in zip(port_nos, rx_rates, over, under):
+        key = (dpid, port_no)
+        count = watchlist.get(key)
+        if is_over:
+            alarms.append((port_no, rx))
+            if count is None and key not in blocklist:
+                watch_updates[key] = 0
+            elif count is not None:
+                watch_updates[key] = count + 1
+        elif is_under and count:
+            watch_updates[key] = count - 1
+
+    limit = final_threshold(threshold, num_active_ports)
+    blocks = []
+    for port_no, rx in zip(port_nos, rx_rates):
+        key = (dpid, port_no)
+        count = watch_updates.get(key, watchlist.get(key))
+        if count is not None and rx > limit and count > watch_limit:
+            blocks.append(key)
+
+    return alarms, watch_updates, blocks
+
+
+def attribute_congestion(capacity, ingress_rates, lower_threshold):
+    """Split a congested link's capacity among the active ingress ports feeding it.
+
+    ingress_rates maps (dpid, port_no) of edge ports upstream of the link to
+    their rx rate. Returns (fair_share, offenders): the per-port share of
+    the link and the ports sending more than it.
+    """
+    active = {key: rx for key, rx in ingress_rates.items() if rx > lower_threshold}
+    if len(active) < 2:
+        # con una sola sorgente non c'e' nessuno da proteggere
+        return NO_LIMIT, []
+    share = final_threshold(capacity, len(active))
+    return share, [key for key, rx in active.items() if rx > share]
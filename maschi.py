@@ -18,7 +18,7 @@ class SimpleSwitch13(app_manager.RyuApp):
         self.mac_to_port = {}
 
         self.num_active_ports = 0
-        self.active_ports = []
+        self.active_ports = {} # dpid -> insieme delle porte sopra lower_threshold
 
         self.datapaths = {}
         self.port_stats = {}
@@ -109,6 +109,13 @@ class SimpleSwitch13(app_manager.RyuApp):
         req = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
         datapath.send_msg(req)
 
+    def _update_active_port(self, dpid, port_no, throughput):
+        # aggiornamento incrementale: O(1) per porta invece di riscandire lo switch
+        if throughput > self.lower_threshold:
+            self.active_ports[dpid].add(port_no)
+        else:
+            self.active_ports[dpid].discard(port_no)
+
     @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, CONFIG_DISPATCHER])
     def _state_change_handler(self, ev):
         datapath = ev.datapath
@@ -128,6 +135,7 @@ class SimpleSwitch13(app_manager.RyuApp):
         dpid = datapath.id
 
         self.port_stats.setdefault(dpid, {})
+        self.active_ports.setdefault(dpid, set())
 
         for stat in body:
             port_no = stat.port_no
@@ -161,6 +169,7 @@ class SimpleSwitch13(app_manager.RyuApp):
                 self.port_stats[dpid][port_no]['timestamp'] = curr_time
                 self.port_stats[dpid][port_no]['rx_throughput'] = rx_throughput
                 self.port_stats[dpid][port_no]['tx_throughput'] = tx_throughput
+                self._update_active_port(dpid, port_no, rx_throughput + tx_throughput)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -257,14 +266,14 @@ class SimpleSwitch13(app_manager.RyuApp):
                         'rx_throughput': stats.get('rx_throughput', 0),
                         'tx_throughput': stats.get('tx_throughput', 0),
                         'num_active_ports': self.num_active_ports,
-                        'active_ports': self.active_ports,
+                        # stessa colonna di prima (lista di porte), ora dello switch della riga
+                        'active_ports': sorted(self.active_ports.get(dpid, ())),
                         'blocklist': self.blocklist
                     })
 
     def _mitigation_logic(self, rx_throughput, dpid, port_no):
 
-        self.active_ports = [p for p in self.port_stats[dpid] if (self.port_stats[dpid][p].get('rx_throughput', 0)+self.port_stats[dpid][p].get('tx_throughput', 0)) > self.lower_threshold]
-        self.num_active_ports = len(self.active_ports) - 1 - len(self.blocklist)
+        self.num_active_ports = len(self.active_ports[dpid]) - 1 - len(self.blocklist)
 
         if self.num_active_ports > 1:
             if rx_throughput > self.threshold:
@@ -0,0 +1,152 @@
+import bisect
+import functools
+import threading
+import time
+from wsgiref.simple_server import make_server
+
+# secondi: dai pochi microsecondi di un packet-in al secondo di una reply enorme
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric(object):
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {} # tupla dei valori delle label -> valore
+        self._func = None
+
+    def set_function(self, func):
+        """Compute the samples at scrape time instead of on every update.
+
+        func returns a number, or a dict mapping label value tuples to numbers.
+        """
+        self._func = func
+        return self
+
+    def collect(self):
+        if self._func is None:
+            return self.values.items()
+        value = self._func()
+        return value.items() if isinstance(value, dict) else [((), value)]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in self.collect():
+            lines.append(f'{self.name}{_format_labels(self.labels, labels)} {value}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+    def inc(self, amount=1, labels=()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        # [conteggi per bucket (l'ultimo e' +Inf), somma, numero di osservazioni]
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        names = self.labels + ('le',)
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {count}')
+        return lines
+
+
+class Registry(object):
+    """Metrics in the Prometheus text format.
+
+    Updates are plain dict operations with no locking: in the controller
+    they all happen on the Ryu hub, like the scrapes served by wsgi_app.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+    def wsgi_app(self, environ, start_response):
+        if environ.get('PATH_INFO', '/') not in ('/', '/metrics'):
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'not found\n']
+        body = self.render().encode()
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4'),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    def serve(self, port, host='0.0.0.0'):
+        "Serve /metrics from a daemon thread, for processes without the Ryu hub."
+        server = make_server(host, port, self.wsgi_app)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def timed(label):
+    """Record the duration of an event handler in self.handler_latency."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, ev):
+            start = time.perf_counter()
+            try:
+                return method(self, ev)
+            finally:
+                self.handler_latency.observe(time.perf_counter() - start, (label,))
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+import json
+from collections import deque
+
+# Collegamenti tra switch creati da topology.Environment (le porte seguono l'ordine degli addLink):
+# (dpid_a, porta_a, dpid_b, porta_b)
+DEFAULT_LINKS = [
+    (1, 2, 3, 1), # s1 - s3
+    (2, 2, 3, 2), # s2 - s3
+    (3, 3, 4, 1), # s3 - s4
+]
+
+
+class NetworkGraph(object):
+    """Switch-level graph: which port of a datapath leads to which neighbour."""
+
+    def __init__(self, links=()):
+        self.adj = {} # dpid -> {dpid vicino: porta di uscita}
+        self.link_ports = set() # (dpid, porta) che collegano due switch
+        self.peers = {} # (dpid, porta) -> dpid all'altro capo del link
+        self.capacity = {} # (dpid, porta) -> capacita' del link in byte/s, se nota
+        self._trees = {}
+        self._branches = {}
+        for link in links:
+            self.add_link(*link)
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a declared topology.
+
+        JSON: {"links": [{"src": 1, "src_port": 2, "dst": 3, "dst_port": 1,
+        "capacity": 375000}, ...]}, capacity in bytes/s and optional.
+        """
+        with open(path) as f:
+            spec = json.load(f)
+        graph = cls()
+        for link in spec.get('links', []):
+            graph.add_link(link['src'], link['src_port'], link['dst'], link['dst_port'],
+                           capacity=link.get('capacity'))
+        return graph
+
+    def add_link(self, dpid_a, port_a, dpid_b, port_b, capacity=None):
+        self.adj.setdefault(dpid_a, {})[dpid_b] = port_a
+        self.adj.setdefault(dpid_b, {})[dpid_a] = port_b
+        self.link_ports.add((dpid_a, port_a))
+        self.link_ports.add((dpid_b, port_b))
+        self.peers[(dpid_a, port_a)] = dpid_b
+        self.peers[(dpid_b, port_b)] = dpid_a
+        if capacity is not None:
+            self.capacity[(dpid_a, port_a)] = capacity
+            self.capacity[(dpid_b, port_b)] = capacity
+        self._trees.clear()
+        self._branches.clear()
+
+    def remove_link(self, dpid_a, port_a, dpid_b, port_b):
+        self.adj.get(dpid_a, {}).pop(dpid_b, None)
+        self.adj.get(dpid_b, {}).pop(dpid_a, None)
+        for key in ((dpid_a, port_a), (dpid_b, port_b)):
+            self.link_ports.discard(key)
+            self.peers.pop(key, None)
+        self._trees.clear()
+        self._branches.clear()
+
+    def __contains__(self, dpid):
+        return dpid in self.adj
+
+    def is_edge_port(self, dpid, port_no):
+        return (dpid, port_no) not in self.link_ports
+
+    def next_hops(self, dpid, port_no):
+        """Output port towards an edge port (dpid, port_no) for every reachable switch.
+
+        Built with one BFS from the destination switch and cached until the
+        topology changes.
+        """
+        key = (dpid, port_no)
+        tree = self._trees.get(key)
+        if tree is not None:
+            return tree
+        tree = {dpid: port_no}
+        queue = deque([dpid])
+        while queue:
+            node = queue.popleft()
+            for neighbour in self.adj.get(node, ()):
+                if neighbour not in tree:
+                    # il vicino raggiunge la destinazione passando per node
+                    tree[neighbour] = self.adj[neighbour][node]
+                    queue.append(neighbour)
+        self._trees[key] = tree
+        return tree
+
+    def path(self, src_dpid, dst_dpid):
+        parent = {src_dpid: None}
+        queue = deque([src_dpid])
+        while queue:
+            node = queue.popleft()
+            if node == dst_dpid:
+                break
+            for neighbour in self.adj.get(node, ()):
+                if neighbour not in parent:
+                    parent[neighbour] = node
+                    queue.append(neighbour)
+        if dst_dpid not in parent:
+            return []
+        path = []
+        node = dst_dpid
+        while node is not None:
+            path.append(node)
+            node = parent[node]
+        return path[::-1]
+
+    def upstream(self, dpid, port_no):
+        """Switches whose shortest path to the peer of (dpid, port_no) crosses that link.
+
+        Their ingress traffic is what can congest the link in this direction.
+        One BFS per peer switch, cached until the topology changes.
+        """
+        peer = self.peers.get((dpid, port_no))
+        if peer is None:
+            return set()
+        branches = self._branches.get(peer)
+        if branches is None:
+            # ogni nodo eredita il primo salto (vicino di peer) del suo cammino verso peer
+            branches = {}
+            queue = deque()
+            for neighbour in self.adj.get(peer, ()):
+                branches[neighbour] = neighbour
+                queue.append(neighbour)
+            while queue:
+                node = queue.popleft()
+                for neighbour in self.adj.get(node, ()):
+                    if neighbour != peer and neighbour not in branches:
+                        branches[neighbour] = branches[node]
+                        queue.append(neighbour)
+            self._branches[peer] = branches
+        return {node for node, branch in branches.items() if branch == dpid}
@@ -0,0 +1,258 @@
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+from detection import evaluate_reply
+from port_store import PortStatsStore
+from rate_estimator import RateEstimator
+
+# verso i worker: tipo, porta, dpid, timestamp o valore, rx_bytes, tx_bytes
+IN_RECORD = struct.Struct('<BIQdQQ')
+COUNTERS = 1 # contatori di una porta
+END = 2 # fine della reply di uno switch: si valuta
+BLOCKED = 3 # la porta e' stata bloccata (inviato a tutti i worker)
+UNBLOCKED = 4
+
+# dai worker: tipo, porta, dpid, valore
+OUT_RECORD = struct.Struct('<BIQd')
+WATCH = 1 # nuovo contatore della watchlist
+BLOCK = 2 # porta da bloccare, valore = rate RX
+ALARM = 3 # porta oltre la soglia, valore = rate RX
+ACTIVE = 4 # num_active_ports dopo la reply
+
+HEADER = struct.Struct('<QQQ') # record scritti, record letti, stop
+
+
+class RingBuffer(object):
+    """Single-producer single-consumer ring of fixed-size records in shared memory.
+
+    The producer only writes the head counter and the consumer only the
+    tail counter (aligned 8 byte stores), so no lock is needed across
+    processes. push() never waits: when the ring is full it returns False.
+    """
+
+    def __init__(self, record, capacity=65536, name=None):
+        self.record = record
+        self.capacity = capacity
+        size = HEADER.size + record.size * capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _counters(self):
+        return HEADER.unpack_from(self.buf, 0)
+
+    def push(self, records):
+        head, tail, _ = self._counters()
+        if head - tail + len(records) > self.capacity:
+            return False
+        pack_into, size, buf = self.record.pack_into, self.record.size, self.buf
+        for i, record in enumerate(records):
+            pack_into(buf, HEADER.size + (head + i) % self.capacity * size, *record)
+        # il contatore si aggiorna dopo i record: il consumatore non legge mai a meta'
+        struct.pack_into('<Q', buf, 0, head + len(records))
+        return True
+
+    def pop(self, max_records=4096):
+        head, tail, _ = self._counters()
+        n = min(head - tail, max_records)
+        unpack_from, size, buf = self.record.unpack_from, self.record.size, self.buf
+        records = [unpack_from(buf, HEADER.size + (tail + i) % self.capacity * size) for i in range(n)]
+        if n:
+            struct.pack_into('<Q', buf, 8, tail + n)
+        return records
+
+    def stop(self):
+        struct.pack_into('<Q', self.buf, 16, 1)
+
+    def stopped(self):
+        return self._counters()[2] == 1
+
+    def close(self, unlink=False):
+        self.buf.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class Detector(object):
+    """Local-scope detection of controller.py for the datapaths of one worker."""
+
+    def __init__(self, threshold, lower_threshold, watch_limit, monitored_dpids, detection_rate,
+                 window=8, alpha=0.5):
+        self.threshold = threshold
+        self.lower_threshold = lower_threshold
+        self.watch_limit = watch_limit
+        self.monitored_dpids = set(monitored_dpids)
+        self.detection_rate = detection_rate
+        self.store = PortStatsStore()
+        self.rx_rates = RateEstimator(window=window, alpha=alpha)
+        self.active_ports = {}
+        self.watchlist = {}
+        self.blocked = set()
+        self._replies = {} # dpid -> (porte, rx, tx) della reply in arrivo
+
+    def handle(self, records):
+        out = []
+        for kind, port_no, dpid, value, rx, tx in records:
+            if kind == COUNTERS:
+                ports, rx_bytes, tx_bytes = self._replies.setdefault(dpid, ([], [], []))
+                ports.append(port_no)
+                rx_bytes.append(rx)
+                tx_bytes.append(tx)
+            elif kind == END:
+                ports, rx_bytes, tx_bytes = self._replies.pop(dpid, ([], [], []))
+                self._evaluate(dpid, ports, rx_bytes, tx_bytes, value, out)
+            elif kind == BLOCKED:
+                self.blocked.add((dpid, port_no))
+                self.watchlist.pop((dpid, port_no), None)
+            elif kind == UNBLOCKED:
+                self.blocked.discard((dpid, port_no))
+        return out
+
+    def _evaluate(self, dpid, ports, rx_bytes, tx_bytes, now, out):
+        _, rates = self.store.update(dpid, ports, rx_bytes, tx_bytes, now)
+        if not rates:
+            return
+        active = self.active_ports.setdefault(dpid, set())
+        slots = self.store.slots[dpid]
+        smoothed = [self.rx_rates.add(slots[r[0]], r[1]) for r in rates]
+        if self.detection_rate == 'raw':
+            rx_rates = [r[1] for r in rates]
+        elif self.detection_rate == 'ewma':
+            rx_rates = smoothed
+        else:
+            rx_rates = [self.rx_rates.estimate(slots[r[0]], self.detection_rate) for r in rates]
+        num_active_ports = len(active) - 1 - len(self.blocked)
+
+        alarms, watch_updates, blocks = evaluate_reply(dpid, [r[0] for r in rates], rx_rates, num_active_ports,
+                                                       self.threshold, self.watchlist, self.blocked,
+                                                       monitored=dpid in self.monitored_dpids,
+                                                       watch_limit=self.watch_limit)
+        out += [(ALARM, port_no, dpid, rx) for port_no, rx in alarms]
+        out += [(WATCH, key[1], dpid, count) for key, count in watch_updates.items()]
+        self.watchlist.update(watch_updates)
+        rx_by_port = dict(zip((r[0] for r in rates), rx_rates))
+        for key in blocks:
+            # bloccata subito anche qui: non si ripete la decisione in attesa di BLOCKED
+            self.blocked.add(key)
+            self.watchlist.pop(key, None)
+            out.append((BLOCK, key[1], dpid, rx_by_port[key[1]]))
+        for port_no, rx, tx, _ in rates:
+            if rx + tx > self.lower_threshold:
+                active.add(port_no)
+            else:
+                active.discard(port_no)
+        out.append((ACTIVE, 0, dpid, num_active_ports))
+
+
+def _worker(in_name, out_name, params, idle_sleep):
+    inbox = RingBuffer(IN_RECORD, name=in_name)
+    outbox = RingBuffer(OUT_RECORD, name=out_name)
+    detector = Detector(**params)
+    parent = os.getppid()
+    pending = []
+    while not inbox.stopped() and os.getppid() == parent:
+        records = inbox.pop()
+        if records:
+            pending += detector.handle(records)
+        if pending and outbox.push(pending):
+            pending = []
+        elif len(pending) > outbox.capacity:
+            pending = pending[-outbox.capacity // 2:] # il controller non legge: si tengono le piu' recenti
+        if not records:
+            time.sleep(idle_sleep)
+    inbox.close()
+    outbox.close()
+
+
+class DetectionPool(object):
+    """Worker processes running Detector, fed through shared-memory rings.
+
+    Datapaths are assigned to workers by dpid % workers, so every port is
+    always evaluated by the same process. submit() and results() never
+    block: a reply that does not fit in its ring is dropped and counted.
+    The ports notified as blocked are kept to bring restarted workers up
+    to date.
+    """
+
+    def __init__(self, workers, params, capacity=65536, idle_sleep=0.002):
+        self.params = params
+        self.capacity = capacity
+        self.idle_sleep = idle_sleep
+        # spawn: niente fork di un processo con l'hub di eventlet attivo
+        self._ctx = multiprocessing.get_context('spawn')
+        self.dropped = 0
+        self.restarts = 0
+        self.blocked = set() # (dpid, porta) notificate con BLOCKED e non ancora sbloccate
+        self._next_worker = 0
+        self.workers = [self._start() for _ in range(workers)]
+
+    def _start(self):
+        inbox = RingBuffer(IN_RECORD, self.capacity)
+        outbox = RingBuffer(OUT_RECORD, self.capacity)
+        process = self._ctx.Process(target=_worker, args=(inbox.name, outbox.name, self.params, self.idle_sleep),
+                                    daemon=True)
+        process.start()
+        return [inbox, outbox, process]
+
+    def submit(self, dpid, port_nos, rx_bytes, tx_bytes, now):
+        records = [(COUNTERS, port_no, dpid, 0.0, rx, tx) for port_no, rx, tx in zip(port_nos, rx_bytes, tx_bytes)]
+        records.append((END, 0, dpid, now, 0, 0))
+        if not self.workers[dpid % len(self.workers)][0].push(records):
+            self.dropped += 1
+            return False
+        return True
+
+    def notify(self, kind, dpid, port_no):
+        # BLOCKED/UNBLOCKED: num_active_ports dipende dal numero totale di blocchi
+        if kind == BLOCKED:
+            self.blocked.add((dpid, port_no))
+        else:
+            self.blocked.discard((dpid, port_no))
+        for inbox, _, _ in self.workers:
+            if not inbox.push([(kind, port_no, dpid, 0.0, 0, 0)]):
+                self.dropped += 1
+
+    def results(self, max_records=1024):
+        records = []
+        # si parte ogni volta da un worker diverso: sotto carico nessuno resta indietro
+        start = self._next_worker
+        self._next_worker = (start + 1) % len(self.workers)
+        for worker in self.workers[start:] + self.workers[:start]:
+            records += worker[1].pop(max_records - len(records))
+            if len(records) >= max_records:
+                break
+        return records
+
+    def check(self):
+        """Restart dead workers (with empty state); returns how many."""
+        restarted = 0
+        for i, (inbox, outbox, process) in enumerate(self.workers):
+            if not process.is_alive():
+                inbox.close(unlink=True)
+                outbox.close(unlink=True)
+                self.workers[i] = self._start()
+                # il nuovo Detector riparte vuoto: gli si ripetono i blocchi in corso
+                blocked = [(BLOCKED, port_no, dpid, 0.0, 0, 0) for dpid, port_no in sorted(self.blocked)]
+                if blocked and not self.workers[i][0].push(blocked):
+                    self.dropped += 1
+                restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def close(self):
+        for inbox, outbox, process in self.workers:
+            inbox.stop()
+            process.join(timeout=1)
+            inbox.close(unlink=True)
+            outbox.close(unlink=True)
+        self.workers = []
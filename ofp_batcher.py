@@ -0,0 +1,113 @@
+import threading
+import time
+
+
+def flow_key(mod):
+    # (table, match) identifica la regola; per le ADD conta anche la priorita'
+    return (mod.table_id, tuple(sorted(mod.match.items())))
+
+
+class FlowModBatcher(object):
+    """Per-datapath outbound FlowMod queue.
+
+    FlowMods queued with queue() are held for at most flush_delay seconds,
+    then sent in order followed by one OFPBarrierRequest. While queued:
+    an ADD identical (table, match, priority) to a pending ADD replaces it,
+    a DELETE cancels the pending ADDs with the same (table, match), and a
+    repeated DELETE is dropped. saved counts the messages never sent.
+    send_now() sends a message right away, after whatever is queued for
+    the same datapath.
+
+    run() is the flush loop; the caller decides where it runs (a thread, or
+    a green thread together with an eventlet `wakeup` event).
+    """
+
+    def __init__(self, flush_delay=0.05, wakeup=None):
+        self.flush_delay = flush_delay
+
+        self.queued = 0
+        self.sent = 0
+        self.saved = 0
+        self.barriers = 0
+
+        self._pending = {} # dpid -> (datapath, [mod o None], {flow_key: [indici]}, deadline)
+        self._lock = threading.Lock()
+        self._wakeup = wakeup if wakeup is not None else threading.Event()
+
+    def queue(self, datapath, mod):
+        ofproto = datapath.ofproto
+        key = flow_key(mod)
+        with self._lock:
+            self.queued += 1
+            entry = self._pending.get(datapath.id)
+            if entry is None:
+                entry = self._pending[datapath.id] = (datapath, [], {}, time.time() + self.flush_delay)
+                self._wakeup.set()
+            _, mods, index, _ = entry
+            positions = index.setdefault(key, [])
+
+            if mod.command == ofproto.OFPFC_DELETE:
+                last = mods[positions[-1]] if positions else None
+                if last is not None and last.command == ofproto.OFPFC_DELETE:
+                    self.saved += 1
+                    return
+                for pos in positions:
+                    if mods[pos] is not None and mods[pos].command == ofproto.OFPFC_ADD:
+                        mods[pos] = None
+                        self.saved += 1
+            elif mod.command == ofproto.OFPFC_ADD:
+                for pos in reversed(positions):
+                    prev = mods[pos]
+                    if prev is None:
+                        continue
+                    if prev.command != ofproto.OFPFC_ADD:
+                        break
+                    if prev.priority == mod.priority:
+                        mods[pos] = None
+                        self.saved += 1
+                        break
+
+            positions.append(len(mods))
+            mods.append(mod)
+
+    def send_now(self, datapath, msg):
+        # i messaggi urgenti (PacketOut, FlowMod con buffer_id, MeterMod) non devono
+        # scavalcare quelli in coda: prima si svuota la coda dello switch
+        self.flush(datapath.id)
+        datapath.send_msg(msg)
+
+    def flush(self, dpid=None, barrier=True):
+        with self._lock:
+            if dpid is None:
+                entries = list(self._pending.values())
+                self._pending.clear()
+            else:
+                entry = self._pending.pop(dpid, None)
+                entries = [entry] if entry is not None else []
+        for datapath, mods, _, _ in entries:
+            self._send(datapath, mods, barrier)
+
+    def _send(self, datapath, mods, barrier):
+        sent = 0
+        for mod in mods:
+            if mod is not None:
+                datapath.send_msg(mod)
+                sent += 1
+        if sent and barrier:
+            datapath.send_msg(datapath.ofproto_parser.OFPBarrierRequest(datapath))
+            self.barriers += 1
+        self.sent += sent
+
+    def run(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                due = [dpid for dpid, entry in self._pending.items() if entry[3] <= now]
+                deadlines = [entry[3] for entry in self._pending.values() if entry[3] > now]
+            for dpid in due:
+                self.flush(dpid)
+            if deadlines:
+                self._wakeup.wait(min(deadlines) - now)
+            else:
+                self._wakeup.wait()
+            self._wakeup.clear()
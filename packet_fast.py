@@ -0,0 +1,17 @@
+import struct
+
+# dst MAC, src MAC, ethertype
+ETH_HEADER = struct.Struct('!6s6sH')
+
+
+def parse_eth(data):
+    """Read (dst, src, ethertype) straight from the first 14 bytes of a frame.
+
+    unpack_from works on the packet-in buffer in place, without building a
+    ryu packet.Packet. MACs are returned in the same 'aa:bb:..' form as
+    ryu's ethernet.ethernet. Returns None if the frame is too short.
+    """
+    if len(data) < ETH_HEADER.size:
+        return None
+    dst, src, ethertype = ETH_HEADER.unpack_from(data)
+    return dst.hex(':'), src.hex(':'), ethertype
@@ -0,0 +1,128 @@
+import heapq
+import threading
+import time
+
+
+class StatsPoller(object):
+    """Per-datapath stats polling schedule.
+
+    Every datapath has its own interval and deadline, kept in a heap so the
+    monitor thread can sleep until the next one is due. Datapaths are
+    staggered when they register, hot ones are polled at min_interval and
+    idle ones back off towards max_interval. At most max_outstanding
+    requests are in flight per datapath; a request that gets no reply
+    within request_timeout seconds is forgotten.
+
+    wait() sleeps until the next deadline, or until a datapath is added or
+    made hot; pass an eventlet event as `wakeup` when the monitor is a green
+    thread.
+    """
+
+    def __init__(self, base_interval=2.0, min_interval=1.0, max_interval=8.0,
+                 backoff=1.5, max_outstanding=1, request_timeout=10.0, wakeup=None):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_outstanding = max_outstanding
+        self.request_timeout = request_timeout
+
+        self.intervals = {}
+        self.outstanding = {}
+        self.skipped = 0
+
+        self._deadline = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = wakeup if wakeup is not None else threading.Event()
+
+    def add(self, dpid, now):
+        with self._lock:
+            if dpid in self.intervals:
+                return
+            # sfasamento con la sequenza di Weyl: gli switch non partono tutti insieme
+            offset = (len(self.intervals) * 0.618033988749895) % 1.0 * self.base_interval
+            self.intervals[dpid] = self.base_interval
+            self.outstanding[dpid] = []
+            self._schedule(dpid, now + offset)
+        self._wakeup.set()
+
+    def remove(self, dpid):
+        with self._lock:
+            self.intervals.pop(dpid, None)
+            self.outstanding.pop(dpid, None)
+            self._deadline.pop(dpid, None)
+
+    def due(self, now):
+        """Pop the datapaths whose deadline has passed and mark them as polled."""
+        ready = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, dpid = heapq.heappop(self._heap)
+                if self._deadline.get(dpid) != deadline:
+                    continue
+                pending = self.outstanding[dpid]
+                pending[:] = [t for t in pending if now - t < self.request_timeout]
+                self._schedule(dpid, now + self.intervals[dpid])
+                if len(pending) >= self.max_outstanding:
+                    self.skipped += 1
+                    continue
+                pending.append(now)
+                ready.append(dpid)
+        return ready
+
+    def replied(self, dpid):
+        "Mark the oldest request as answered; returns when it was sent, or None."
+        with self._lock:
+            pending = self.outstanding.get(dpid)
+            if pending:
+                return pending.pop(0)
+        return None
+
+    def update(self, dpid, hot, idle, now):
+        earlier = False
+        with self._lock:
+            if dpid not in self.intervals:
+                return
+            interval = self.intervals[dpid]
+            if hot:
+                new_interval = self.min_interval
+            elif idle:
+                new_interval = min(interval * self.backoff, self.max_interval)
+            else:
+                new_interval = self.base_interval
+            self.intervals[dpid] = new_interval
+            # una porta diventata calda non deve aspettare il vecchio intervallo lungo
+            if new_interval < interval and self._deadline[dpid] > now + new_interval:
+                self._schedule(dpid, now + new_interval)
+                earlier = True
+        if earlier:
+            self._wakeup.set()
+
+    def next_delay(self, now, cap=None):
+        "Seconds until the next deadline (at most cap); None when nothing is scheduled."
+        with self._lock:
+            while self._heap and self._deadline.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return cap
+            delay = max(self._heap[0][0] - now, 0)
+            return delay if cap is None else min(delay, cap)
+
+    def wait(self, max_wait=None):
+        # senza switch registrati si dorme finche' add() non sveglia il monitor
+        timeout = self.next_delay(time.time(), max_wait)
+        if timeout is None or timeout > 0:
+            self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def poll_rate(self, dpid):
+        interval = self.intervals.get(dpid)
+        return 1.0 / interval if interval else 0.0
+
+    def poll_rates(self):
+        return {dpid: 1.0 / interval for dpid, interval in self.intervals.items()}
+
+    def _schedule(self, dpid, deadline):
+        self._deadline[dpid] = deadline
+        heapq.heappush(self._heap, (deadline, dpid))
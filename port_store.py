@@ -0,0 +1,95 @@
+from array import array
+
+
+class PortStatsStore(object):
+    """Port statistics kept in contiguous typed arrays.
+
+    Each (dpid, port_no) gets a slot the first time it is seen; every field
+    is an array indexed by slot, so no per-port dict is allocated and the
+    whole reply of a datapath is processed in one pass by update().
+    """
+    FIELDS = ('rx_bytes', 'tx_bytes', 'timestamp', 'rx_throughput', 'tx_throughput')
+
+    def __init__(self):
+        self.slots = {} # dpid -> {port_no: slot}
+        self.rx_bytes = array('Q')
+        self.tx_bytes = array('Q')
+        self.timestamp = array('d')
+        self.rx_throughput = array('d')
+        self.tx_throughput = array('d')
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __contains__(self, key):
+        dpid, port_no = key
+        return port_no in self.slots.get(dpid, ())
+
+    def dpids(self):
+        return list(self.slots)
+
+    def port_nos(self, dpid):
+        return list(self.slots.get(dpid, ()))
+
+    def slot(self, dpid, port_no):
+        ports = self.slots.setdefault(dpid, {})
+        slot = ports.get(port_no)
+        if slot is None:
+            slot = ports[port_no] = len(self.timestamp)
+            self.rx_bytes.append(0)
+            self.tx_bytes.append(0)
+            self.timestamp.append(0.0)
+            self.rx_throughput.append(0.0)
+            self.tx_throughput.append(0.0)
+        return slot
+
+    def restore(self, dpid, port_no, rx_bytes, tx_bytes, timestamp):
+        # contatori salvati prima di un riavvio: la prima reply ha gia' un rate
+        slot = self.slot(dpid, port_no)
+        self.rx_bytes[slot] = rx_bytes
+        self.tx_bytes[slot] = tx_bytes
+        self.timestamp[slot] = timestamp
+
+    def get(self, dpid, port_no, field, default=0):
+        slot = self.slots.get(dpid, {}).get(port_no)
+        if slot is None:
+            return default
+        return getattr(self, field)[slot]
+
+    def column(self, dpid, field):
+        values = getattr(self, field)
+        return [values[slot] for slot in self.slots.get(dpid, {}).values()]
+
+    def update(self, dpid, port_nos, rx_bytes, tx_bytes, now):
+        """Store a whole reply and compute its rates in bytes/sec.
+
+        Returns (new_ports, rates): the ports seen for the first time, which
+        have no rate yet, and (port_no, rx_throughput, tx_throughput, moved)
+        for the others, where moved is False when the port was idle both
+        before and now.
+        """
+        ports = self.slots.setdefault(dpid, {})
+        new_ports = []
+        rates = []
+        rx_prev, tx_prev, ts = self.rx_bytes, self.tx_bytes, self.timestamp
+        rx_tp, tx_tp = self.rx_throughput, self.tx_throughput
+
+        for port_no, rx, tx in zip(port_nos, rx_bytes, tx_bytes):
+            slot = ports.get(port_no)
+            if slot is None:
+                slot = self.slot(dpid, port_no)
+                new_ports.append(port_no)
+            else:
+                time_diff = now - ts[slot]
+                if time_diff <= 0:
+                    continue
+                rx_rate = (rx - rx_prev[slot]) / time_diff
+                tx_rate = (tx - tx_prev[slot]) / time_diff
+                moved = bool(rx_rate or tx_rate or rx_tp[slot] or tx_tp[slot])
+                rx_tp[slot] = rx_rate
+                tx_tp[slot] = tx_rate
+                rates.append((port_no, rx_rate, tx_rate, moved))
+            rx_prev[slot] = rx
+            tx_prev[slot] = tx
+            ts[slot] = now
+        return new_ports, rates
@@ -0,0 +1,80 @@
+from array import array
+
+
+class RateEstimator(object):
+    """Sliding window of the last `window` rate samples for every slot.
+
+    The samples of all slots share one contiguous array('d') used as a set
+    of ring buffers, so memory is bounded by window * slots. Alongside the
+    window an EWMA is kept, so the smoothed rate is O(1) to read; min, max
+    and percentiles are computed over the (small) window on demand.
+    """
+
+    def __init__(self, window=8, alpha=0.5):
+        self.window = window
+        self.alpha = alpha
+        self.samples = array('d')
+        self.ewmas = array('d')
+        self.counts = array('I')
+
+    def _grow(self, slot):
+        while len(self.counts) <= slot:
+            self.samples.extend([0.0] * self.window)
+            self.ewmas.append(0.0)
+            self.counts.append(0)
+
+    def add(self, slot, rate):
+        if slot >= len(self.counts):
+            self._grow(slot)
+        count = self.counts[slot]
+        self.samples[slot * self.window + count % self.window] = rate
+        self.ewmas[slot] = rate if count == 0 else self.alpha * rate + (1 - self.alpha) * self.ewmas[slot]
+        self.counts[slot] = count + 1
+        return self.ewmas[slot]
+
+    def recent(self, slot):
+        if slot >= len(self.counts):
+            return []
+        n = min(self.counts[slot], self.window)
+        start = slot * self.window
+        return self.samples[start:start + n].tolist()
+
+    def ewma(self, slot):
+        return self.ewmas[slot] if slot < len(self.ewmas) else 0.0
+
+    def min(self, slot):
+        return min(self.recent(slot), default=0.0)
+
+    def max(self, slot):
+        return max(self.recent(slot), default=0.0)
+
+    def percentile(self, slot, q=95):
+        values = sorted(self.recent(slot))
+        if not values:
+            return 0.0
+        # nearest-rank
+        rank = max(int(-(-q * len(values) // 100)), 1)
+        return values[rank - 1]
+
+    def stats(self, slot):
+        values = self.recent(slot)
+        if not values:
+            return {'ewma': 0.0, 'min': 0.0, 'max': 0.0, 'p95': 0.0, 'samples': 0}
+        return {
+            'ewma': self.ewmas[slot],
+            'min': min(values),
+            'max': max(values),
+            'p95': self.percentile(slot, 95),
+            'samples': self.counts[slot],
+        }
+
+    def estimate(self, slot, kind):
+        if kind == 'ewma':
+            return self.ewma(slot)
+        if kind == 'p95':
+            return self.percentile(slot, 95)
+        if kind == 'min':
+            return self.min(slot)
+        if kind == 'max':
+            return self.max(slot)
+        raise ValueError(f'unknown rate estimate {kind!r}')
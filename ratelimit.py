@@ -0,0 +1,40 @@
+class RateLimiter(object):
+    """Token buckets keyed by an arbitrary hashable (dpid, (dpid, port), mac...).
+
+    Each key refills at `rate` tokens/s up to `burst`; allow() spends one
+    token. Buckets are created lazily and, once more than max_keys exist,
+    the ones that have refilled completely (idle keys) are dropped.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = {} # chiave -> [token, ultimo aggiornamento]
+        self.accepted = 0
+        self.dropped = 0
+
+    def allow(self, key, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self._prune(now)
+            bucket = self.buckets[key] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.accepted += 1
+            return True
+        self.dropped += 1
+        return False
+
+    def forget(self, key):
+        self.buckets.pop(key, None)
+
+    def _prune(self, now):
+        full = [key for key, (tokens, last) in self.buckets.items()
+                if tokens + (now - last) * self.rate >= self.burst]
+        for key in full:
+            del self.buckets[key]
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+"""Replay a recorded port stats trace through the detection/mitigation policy.
+
+    python replay.py port_stats.csv
+    python replay.py port_stats.bin --threshold 250000 --watch-limit 2
+    python replay.py port_stats.csv --sweep threshold=200000,300000 --sweep lower_ratio=0.02,0.05
+    python replay.py port_stats.csv --sweep monitored_dpids=3,1:3
+
+The trace is streamed (CSV written by the controller or the binary format
+of stats_sink), grouped back into one reply per (timestamp, dpid) and fed
+to the same evaluate_reply() used by controller.py, as fast as possible.
+The replay is open loop: blocking a port does not change the recorded
+traffic that follows.
+"""
+import argparse
+import csv
+import itertools
+import time
+from multiprocessing import Pool
+
+from detection import evaluate_reply
+from rate_estimator import RateEstimator
+from stats_sink import MAGIC, read_binary
+from timers import DeadlineHeap
+
+
+def read_trace(path):
+    """Yield (timestamp, dpid, port_no, rx_throughput, tx_throughput) from a trace."""
+    with open(path, 'rb') as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    if binary:
+        for record in read_binary(path):
+            yield record[0], record[1], record[2], record[5], record[6]
+        return
+
+    stamps = {}
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        column = {name: i for i, name in enumerate(next(reader))}
+        ts_i, dpid_i, port_i = column['timestamp'], column['dpid'], column['port_no']
+        rx_i, tx_i = column['rx_throughput'], column['tx_throughput']
+        for row in reader:
+            stamp = row[ts_i]
+            ts = stamps.get(stamp)
+            if ts is None:
+                if len(stamps) > 4096:
+                    stamps.clear()
+                ts = stamps[stamp] = time.mktime(time.strptime(stamp, '%Y-%m-%d %H:%M:%S'))
+            yield ts, int(row[dpid_i]), int(row[port_i]), float(row[rx_i]), float(row[tx_i])
+
+
+def replies(rows):
+    """Group consecutive rows into (timestamp, dpid, [(port_no, rx, tx)])."""
+    for (ts, dpid), group in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+        yield ts, dpid, [(row[2], row[3], row[4]) for row in group]
+
+
+class Replay(object):
+    """Detection state machine of controller.py (local scope) without Ryu."""
+
+    def __init__(self, threshold=300000, lower_ratio=0.02, watch_limit=1, monitored_dpids=(3,),
+                 detection_rate='ewma', window=8, alpha=0.5,
+                 block_time=25, max_block_time=600, offence_memory=600, unblock_grace=2):
+        self.threshold = threshold
+        self.lower_threshold = lower_ratio * threshold
+        self.watch_limit = watch_limit
+        # un solo dpid (ad esempio da --sweep monitored_dpids=3) vale come lista
+        self.monitored_dpids = set(monitored_dpids) if isinstance(monitored_dpids, (list, tuple, set)) else {monitored_dpids}
+        self.detection_rate = detection_rate
+        self.block_time = block_time
+        self.max_block_time = max_block_time
+        self.offence_memory = offence_memory
+        # nel replay non ci sono FlowRemoved: lo sblocco arriva come dal timer di riserva del
+        # controller, unblock_grace secondi dopo la scadenza (0 per l'hard timeout dello switch)
+        self.unblock_grace = unblock_grace
+
+        self.watchlist = {}
+        self.blocklist = {}
+        self.block_timers = DeadlineHeap()
+        self.offences = {}
+        self.active_ports = {}
+        self.rx_rates = RateEstimator(window=window, alpha=alpha)
+        self.slots = {}
+        self._next_slot = 0
+
+        self.events = [] # (timestamp, evento, dpid, porta, rate)
+        self.replies = 0
+        self.first_ts = None
+        self.last_ts = None
+
+    def feed(self, ts, dpid, ports):
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+        self.replies += 1
+
+        for key in self.block_timers.pop_expired(ts):
+            del self.blocklist[key]
+            self.events.append((ts, 'unblock', key[0], key[1], 0.0))
+
+        active = self.active_ports.setdefault(dpid, set())
+        num_active_ports = len(active) - 1 - len(self.blocklist)
+        port_nos = [p[0] for p in ports]
+        rx_rates = self._rates(dpid, ports)
+
+        alarms, watch_updates, blocks = evaluate_reply(dpid, port_nos, rx_rates, num_active_ports,
+                                                       self.threshold, self.watchlist, self.blocklist,
+                                                       monitored=dpid in self.monitored_dpids,
+                                                       watch_limit=self.watch_limit)
+        for port_no, rx in alarms:
+            if (dpid, port_no) not in self.watchlist and (dpid, port_no) in watch_updates:
+                self.events.append((ts, 'watch', dpid, port_no, rx))
+        self.watchlist.update(watch_updates)
+        rates = dict(zip(port_nos, rx_rates))
+        for key in blocks:
+            self.watchlist.pop(key, None)
+            if key not in self.blocklist:
+                self.blocklist[key] = ts + self._block_duration(key, ts)
+                self.block_timers.schedule(key, self.blocklist[key] + self.unblock_grace)
+                self.events.append((ts, 'block', key[0], key[1], rates[key[1]]))
+
+        for port_no, rx, tx in ports:
+            if rx + tx > self.lower_threshold:
+                active.add(port_no)
+            else:
+                active.discard(port_no)
+
+    def _rates(self, dpid, ports):
+        if self.detection_rate == 'raw':
+            return [p[1] for p in ports]
+        slots = self.slots.setdefault(dpid, {})
+        rates = []
+        for port_no, rx, _ in ports:
+            slot = slots.get(port_no)
+            if slot is None:
+                slot = slots[port_no] = self._next_slot
+                self._next_slot += 1
+            smoothed = self.rx_rates.add(slot, rx)
+            rates.append(smoothed if self.detection_rate == 'ewma' else self.rx_rates.estimate(slot, self.detection_rate))
+        return rates
+
+    def _block_duration(self, key, ts):
+        count, last = self.offences.get(key, (0, ts))
+        if ts - last > self.offence_memory:
+            count = 0
+        self.offences[key] = (count + 1, ts)
+        return min(self.block_time * 2 ** count, self.max_block_time)
+
+    def summary(self):
+        first = {}
+        for ts, kind, _, _, _ in self.events:
+            first.setdefault(kind, ts)
+        blocks = [e for e in self.events if e[1] == 'block']
+        return {
+            'replies': self.replies,
+            'duration': (self.last_ts - self.first_ts) if self.first_ts is not None else 0,
+            'watches': sum(1 for e in self.events if e[1] == 'watch'),
+            'blocks': len(blocks),
+            'unblocks': sum(1 for e in self.events if e[1] == 'unblock'),
+            'time_to_watch': first['watch'] - self.first_ts if 'watch' in first else None,
+            'time_to_block': first['block'] - self.first_ts if 'block' in first else None,
+            'blocked_ports': sorted({(e[2], e[3]) for e in blocks}),
+        }
+
+
+def run(path, params):
+    replay = Replay(**params)
+    for ts, dpid, ports in replies(read_trace(path)):
+        replay.feed(ts, dpid, ports)
+    return replay
+
+
+def _sweep_one(job):
+    path, params = job
+    start = time.time()
+    summary = run(path, params).summary()
+    summary['wall'] = time.time() - start
+    return params, summary
+
+
+def _parse_value(value):
+    if ':' in value:
+        # parametri lista (monitored_dpids): elementi separati da ':'
+        return [_parse_value(v) for v in value.split(':')]
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a port stats trace through the mitigation policy')
+    parser.add_argument('trace')
+    parser.add_argument('--threshold', type=float, default=300000)
+    parser.add_argument('--lower-ratio', type=float, default=0.02)
+    parser.add_argument('--watch-limit', type=int, default=1)
+    parser.add_argument('--detection-rate', default='ewma', choices=['raw', 'ewma', 'p95', 'min', 'max'])
+    parser.add_argument('--dpid', type=int, action='append', help='monitored datapath (default: 3)')
+    parser.add_argument('--block-time', type=float, default=25)
+    parser.add_argument('--unblock-grace', type=float, default=2,
+                        help='seconds between the end of a block and the unblock (0: switch hard timeout)')
+    parser.add_argument('--sweep', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help="sweep a Replay parameter, list values joined by ':'; repeat to build a grid")
+    parser.add_argument('--workers', type=int, default=None, help='processes for --sweep (default: all cores)')
+    args = parser.parse_args()
+
+    params = {
+        'threshold': args.threshold,
+        'lower_ratio': args.lower_ratio,
+        'watch_limit': args.watch_limit,
+        'detection_rate': args.detection_rate,
+        'monitored_dpids': args.dpid or [3],
+        'block_time': args.block_time,
+        'unblock_grace': args.unblock_grace,
+    }
+
+    if not args.sweep:
+        start = time.time()
+        replay = run(args.trace, params)
+        wall = time.time() - start
+        print('timestamp,event,dpid,port_no,rx_rate')
+        for ts, kind, dpid, port_no, rate in replay.events:
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))},{kind},{dpid},{port_no},{rate:.1f}")
+        summary = replay.summary()
+        speedup = summary['duration'] / wall if wall > 0 else float('inf')
+        print(f"# {summary['replies']} replies, {summary['blocks']} blocks, {summary['unblocks']} unblocks, "
+              f"time to block {summary['time_to_block']}s, {wall:.3f}s wall ({speedup:.0f}x real time)")
+        return
+
+    names, values = [], []
+    for item in args.sweep:
+        name, _, raw = item.partition('=')
+        names.append(name)
+        values.append([_parse_value(v) for v in raw.split(',')])
+    jobs = [(args.trace, dict(params, **dict(zip(names, combo)))) for combo in itertools.product(*values)]
+
+    with Pool(args.workers) as pool:
+        results = pool.map(_sweep_one, jobs)
+
+    print(','.join(names + ['watches', 'blocks', 'unblocks', 'time_to_block', 'blocked_ports', 'wall']))
+    for run_params, summary in results:
+        fields = [str(run_params[name]) for name in names]
+        fields += [str(summary['watches']), str(summary['blocks']), str(summary['unblocks']),
+                   str(summary['time_to_block']), '"%s"' % summary['blocked_ports'], f"{summary['wall']:.3f}"]
+        print(','.join(fields))
+
+
+if __name__ == '__main__':
+    main()
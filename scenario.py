@@ -0,0 +1,271 @@
+#!/usr/bin/python
+"""Run a DDoS scenario on a topology.Environment against the running controller.
+
+    sudo python scenario.py
+    sudo python scenario.py scenario.json --output results.json
+
+On a generated topology the controller needs its switch links:
+
+    python scenario.py scenario.json --graph graph.json
+    NCIS_TOPOLOGY=graph.json ryu-manager controller.py
+
+The scenario (JSON/YAML, or DEFAULT_SCENARIO) lists iperf workloads, each
+with src/dst hosts, protocol, rate and start/stop times in seconds from the
+beginning of the run. A workload with role "attack" is a flood, "legit" is
+the traffic that should survive the mitigation. The controller must already
+be running (ryu-manager controller.py).
+
+Per workload and per second the throughput received by the iperf server is
+collected. The mitigation rules (table 0, priority >= 2) are read with
+ovs-ofctl from every switch, so the report gives:
+- time to detect: first mitigation rule on an ingress port crossed by an
+  attack (its edge port or an inter-switch port along its path)
+- time to mitigate: first second in which the attack delivers less than
+  mitigated_ratio of its offered rate
+- collateral damage: throughput lost by legit workloads while the attack is
+  running, compared with their rate before it, and the mitigated ports that
+  carry no attack traffic at all.
+"""
+import argparse
+import json
+import re
+import subprocess
+import threading
+import time
+
+from mininet.log import setLogLevel, info
+
+from netgraph import NetworkGraph
+from topology import Environment, load_spec
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DEFAULT_SCENARIO = {
+    'topology': {'generator': 'ncis'},
+    'duration': 90,
+    'mitigated_ratio': 0.2,
+    'workloads': [
+        {'name': 'flood', 'role': 'attack', 'src': 'h1', 'dst': 'h3', 'proto': 'udp', 'rate': '5M',
+         'start': 20, 'stop': 70},
+        {'name': 'legit-h2', 'role': 'legit', 'src': 'h2', 'dst': 'h3', 'proto': 'udp', 'rate': '500K',
+         'start': 0, 'stop': 90},
+        {'name': 'legit-h4', 'role': 'legit', 'src': 'h4', 'dst': 'h3', 'proto': 'udp', 'rate': '500K',
+         'start': 0, 'stop': 90},
+    ],
+}
+
+BASE_PORT = 5001
+RULE = re.compile(r'table=(\d+).*priority=(\d+).*in_port="?(\w+)"?')
+UNITS = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9}
+
+
+def parse_rate(rate):
+    "iperf bandwidth ('5M', '500K') in bit/s."
+    rate = str(rate).upper()
+    unit = rate[-1] if rate[-1] in UNITS else ''
+    return float(rate[:len(rate) - len(unit)]) * UNITS[unit]
+
+
+def load_scenario(path):
+    if path is None:
+        return DEFAULT_SCENARIO
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise RuntimeError('PyYAML is required for YAML scenario files')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class Workload(object):
+    def __init__(self, env, graph, index, spec):
+        self.name = spec.get('name', f"{spec['src']}-{spec['dst']}")
+        self.role = spec.get('role', 'legit')
+        self.src = env.hosts[spec['src']]
+        self.dst = env.hosts[spec['dst']]
+        self.udp = spec.get('proto', 'udp') == 'udp'
+        self.rate = spec.get('rate', '1M')
+        self.start = spec.get('start', 0)
+        self.stop = spec['stop']
+        self.port = BASE_PORT + index
+        self.edge = env.edge_port(spec['src'])
+        self.ingress = self._ingress_ports(graph, self.edge, env.edge_port(spec['dst'])[0])
+        self.samples = [] # (secondi dall'inizio, bit/s ricevuti)
+        self.server = None
+        self.client = None
+
+    @staticmethod
+    def _ingress_ports(graph, edge, dst_dpid):
+        # (dpid, porta di ingresso) di ogni switch attraversato verso la destinazione
+        path = graph.path(edge[0], dst_dpid) or [edge[0]]
+        ports = [edge]
+        for previous, node in zip(path, path[1:]):
+            ports.append((node, graph.adj[node][previous]))
+        return ports
+
+    def offered(self):
+        return parse_rate(self.rate) if self.udp else None
+
+    def start_server(self, t0):
+        cmd = ['iperf', '-s', '-p', str(self.port), '-i', '1', '-y', 'C'] + (['-u'] if self.udp else [])
+        self.server = self.dst.popen(cmd, universal_newlines=True)
+        threading.Thread(target=self._read_server, args=(t0,), daemon=True).start()
+
+    def _read_server(self, t0):
+        for line in self.server.stdout:
+            fields = line.strip().split(',')
+            # timestamp,src,sport,dst,dport,id,intervallo,byte,bit/s[,jitter,persi,...]
+            if len(fields) < 9 or '-' not in fields[6]:
+                continue
+            begin, end = [float(x) for x in fields[6].split('-')]
+            if end - begin > 1.5:
+                continue # riepilogo finale dell'intero test
+            self.samples.append((time.time() - t0, float(fields[8])))
+
+    def start_client(self):
+        cmd = ['iperf', '-c', self.dst.IP(), '-p', str(self.port), '-t', str(self.stop - self.start)]
+        if self.udp:
+            cmd += ['-u', '-b', str(self.rate)]
+        self.client = self.src.popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def terminate(self):
+        for proc in (self.client, self.server):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+
+    def mean_rate(self, begin, end):
+        rates = [bps for t, bps in self.samples if begin <= t < end]
+        return sum(rates) / len(rates) if rates else None
+
+
+class Scenario(object):
+    def __init__(self, env, spec):
+        self.env = env
+        self.duration = spec['duration']
+        self.mitigated_ratio = spec.get('mitigated_ratio', 0.2)
+        self.flow_poll = spec.get('flow_poll', 0.5)
+        graph = NetworkGraph(env.switch_links())
+        self.workloads = [Workload(env, graph, i, w) for i, w in enumerate(spec['workloads'])]
+        self.rules = {} # (dpid, porta) -> secondi dall'inizio in cui compare la prima regola
+        self._stopped = threading.Event()
+
+    def run(self):
+        t0 = time.time()
+        for w in self.workloads:
+            w.start_server(t0)
+        timers = [threading.Timer(w.start, w.start_client) for w in self.workloads]
+        for timer in timers:
+            timer.start()
+        monitor = threading.Thread(target=self._watch_flows, args=(t0,), daemon=True)
+        monitor.start()
+        info(f"*** Running {len(self.workloads)} workloads for {self.duration}s\n")
+        try:
+            time.sleep(self.duration + 2) # l'ultimo intervallo di iperf arriva dopo la fine
+        finally:
+            self._stopped.set()
+            for timer in timers:
+                timer.cancel()
+            for w in self.workloads:
+                w.terminate()
+            monitor.join()
+        return self.report()
+
+    def _watch_flows(self, t0):
+        switches = list(self.env.switches.items())
+        while not self._stopped.wait(self.flow_poll):
+            now = time.time() - t0
+            for name, switch in switches:
+                dump = subprocess.run(['ovs-ofctl', '-O', 'OpenFlow13', '--no-names', 'dump-flows', name],
+                                      capture_output=True, universal_newlines=True).stdout
+                for match in RULE.finditer(dump):
+                    table, priority, in_port = match.groups()
+                    if table == '0' and int(priority) >= 2 and in_port.isdigit():
+                        self.rules.setdefault((int(switch.dpid, 16), int(in_port)), now)
+
+    def report(self):
+        attacks = [w for w in self.workloads if w.role == 'attack']
+        legit = [w for w in self.workloads if w.role != 'attack']
+        attack_start = min((w.start for w in attacks), default=None)
+        attack_stop = max((w.stop for w in attacks), default=None)
+
+        results = {'workloads': [], 'time_to_detect': None, 'time_to_mitigate': None,
+                   'collateral_loss': None, 'false_positives': []}
+        for w in self.workloads:
+            results['workloads'].append({
+                'name': w.name, 'role': w.role, 'edge': list(w.edge), 'offered': w.offered(),
+                'mean': w.mean_rate(w.start, w.stop), 'samples': w.samples,
+            })
+
+        detected = [self.rules[key] - w.start for w in attacks for key in w.ingress if key in self.rules]
+        if detected:
+            results['time_to_detect'] = min(detected)
+        mitigated = []
+        for w in attacks:
+            limit = self.mitigated_ratio * (w.offered() or 0)
+            for t, bps in w.samples:
+                if t >= w.start + 1 and bps < limit:
+                    mitigated.append(t - w.start)
+                    break
+        if mitigated:
+            results['time_to_mitigate'] = min(mitigated)
+
+        if attacks:
+            lost = []
+            for w in legit:
+                before = w.mean_rate(w.start, attack_start)
+                during = w.mean_rate(attack_start, attack_stop)
+                if before and during is not None:
+                    lost.append(max(0.0, 1 - during / before))
+            if lost:
+                results['collateral_loss'] = sum(lost) / len(lost)
+            attacked = {key for w in attacks for key in w.ingress}
+            results['false_positives'] = sorted(key for key in self.rules if key not in attacked)
+        return results
+
+
+def print_report(results):
+    print(f"{'workload':<16}{'role':<8}{'edge':<10}{'offered Mb/s':>14}{'mean Mb/s':>12}")
+    for w in results['workloads']:
+        offered = f"{w['offered'] / 1e6:.2f}" if w['offered'] else '-'
+        mean = f"{w['mean'] / 1e6:.2f}" if w['mean'] is not None else '-'
+        edge = 's%d-eth%d' % tuple(w['edge'])
+        print(f"{w['name']:<16}{w['role']:<8}{edge:<10}{offered:>14}{mean:>12}")
+    for key in ('time_to_detect', 'time_to_mitigate'):
+        value = results[key]
+        print(f"{key}: {value:.1f}s" if value is not None else f"{key}: never")
+    loss = results['collateral_loss']
+    print(f"collateral_loss: {loss:.1%}" if loss is not None else 'collateral_loss: -')
+    blocked = ', '.join('s%d-eth%d' % key for key in results['false_positives'])
+    print(f"false_positives: {blocked or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run an attack scenario against the controller')
+    parser.add_argument('scenario', nargs='?', help='JSON/YAML scenario (default: flood from h1 to h3)')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--graph', help='only write the switch links of the topology, for the controller NCIS_TOPOLOGY')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    spec = load_scenario(args.scenario)
+    if args.graph:
+        # il controller deve conoscere la topologia prima che gli switch si colleghino
+        load_spec(spec.get('topology')).dump_graph(args.graph)
+        return
+    env = Environment(spec.get('topology'))
+    try:
+        results = Scenario(env, spec).run()
+    finally:
+        env.stop()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import sqlite3
+
+
+def rendezvous_owner(dpid, members):
+    """Member with the highest hash for dpid (rendezvous hashing).
+
+    Every process gets the same answer from the same member list, and when a
+    member leaves only its datapaths move to someone else.
+    """
+    def score(member):
+        return hashlib.blake2b(f'{member}/{dpid}'.encode(), digest_size=8).digest()
+    return max(members, key=score) if members else None
+
+
+class ClusterStore(object):
+    """Membership and shared mitigation decisions of the controller processes.
+
+    One sqlite database (WAL mode) shared by every process on the host:
+    members holds the heartbeats, decisions is an append-only list of
+    blocks (kind, key, deadline) that every process reads from its last
+    seen seq, and meta holds the OpenFlow role generation id.
+    """
+
+    def __init__(self, path, node_id, heartbeat_timeout=3.0, decision_ttl=3600):
+        self.node_id = node_id
+        self.heartbeat_timeout = heartbeat_timeout
+        self.decision_ttl = decision_ttl
+        self.last_seq = 0
+
+        self.db = sqlite3.connect(path, timeout=1.0, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS members (node_id TEXT PRIMARY KEY, heartbeat REAL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS decisions (seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                        'node_id TEXT, kind TEXT, key TEXT, deadline REAL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+
+    def heartbeat(self, now):
+        self.db.execute('INSERT OR REPLACE INTO members VALUES (?, ?)', (self.node_id, now))
+
+    def members(self, now):
+        rows = self.db.execute('SELECT node_id FROM members WHERE heartbeat >= ? ORDER BY node_id',
+                               (now - self.heartbeat_timeout,))
+        return [row[0] for row in rows]
+
+    def leave(self):
+        self.db.execute('DELETE FROM members WHERE node_id = ?', (self.node_id,))
+
+    def publish(self, kind, key, deadline):
+        self.db.execute('INSERT INTO decisions (node_id, kind, key, deadline) VALUES (?, ?, ?, ?)',
+                        (self.node_id, kind, json.dumps(key), deadline))
+
+    def decisions(self, now):
+        """Decisions of the other processes since the last call: [(kind, key, deadline)]."""
+        rows = self.db.execute('SELECT seq, node_id, kind, key, deadline FROM decisions WHERE seq > ? ORDER BY seq',
+                               (self.last_seq,)).fetchall()
+        result = []
+        for seq, node_id, kind, key, deadline in rows:
+            self.last_seq = seq
+            if node_id != self.node_id and deadline > now:
+                result.append((kind, tuple(json.loads(key)), deadline))
+        return result
+
+    def active_decisions(self, now):
+        """Every block still running, to start from when a process joins."""
+        rows = self.db.execute('SELECT seq, kind, key, deadline FROM decisions WHERE deadline > ? ORDER BY seq',
+                               (now,)).fetchall()
+        if rows:
+            self.last_seq = max(self.last_seq, rows[-1][0])
+        return [(kind, tuple(json.loads(key)), deadline) for _, kind, key, deadline in rows]
+
+    def prune(self, now):
+        self.db.execute('DELETE FROM decisions WHERE deadline < ?', (now - self.decision_ttl,))
+        self.db.execute('DELETE FROM members WHERE heartbeat < ?', (now - self.decision_ttl,))
+
+    def next_generation(self):
+        # generation_id delle OFPRoleRequest: deve crescere a ogni cambio di master
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.execute('INSERT OR IGNORE INTO meta VALUES (?, 0)', ('generation',))
+            self.db.execute('UPDATE meta SET value = value + 1 WHERE name = ?', ('generation',))
+            return self.db.execute('SELECT value FROM meta WHERE name = ?', ('generation',)).fetchone()[0]
@@ -0,0 +1,71 @@
+from array import array
+
+
+class CountMinSketch(object):
+    """Count-min sketch: depth rows of width counters in one array('Q').
+
+    estimate() never underestimates; it overestimates by at most
+    ~2/width of the total count with high probability. Memory is fixed at
+    width * depth counters whatever the number of keys.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array('Q', [0]) * (width * depth)
+        self.total = 0
+
+    def _indexes(self, key):
+        width = self.width
+        return [row * width + hash((row, key)) % width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        table = self.table
+        indexes = self._indexes(key)
+        for i in indexes:
+            table[i] += count
+        self.total += count
+        return min(table[i] for i in indexes)
+
+    def estimate(self, key):
+        table = self.table
+        return min(table[i] for i in self._indexes(key))
+
+    def clear(self):
+        self.table = array('Q', [0]) * (self.width * self.depth)
+        self.total = 0
+
+
+class SpaceSaving(object):
+    """Space-saving top-k: at most k keys are tracked.
+
+    When a new key arrives and the table is full, it replaces the key with
+    the smallest count and inherits that count as its error bound.
+    """
+
+    def __init__(self, k=64):
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, count=1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.k:
+            counts[key] = count
+            self.errors[key] = 0
+        else:
+            victim = min(counts, key=counts.get)
+            floor = counts.pop(victim)
+            del self.errors[victim]
+            counts[key] = floor + count
+            self.errors[key] = floor
+
+    def top(self, n=None):
+        items = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return items if n is None else items[:n]
+
+    def clear(self):
+        self.counts.clear()
+        self.errors.clear()
@@ -0,0 +1,115 @@
+import json
+import os
+
+
+def _key(value):
+    # JSON non ha tuple: le chiavi (dpid, porta) tornano liste e vanno riconvertite
+    return tuple(_key(v) for v in value) if isinstance(value, list) else value
+
+
+def _plain(value):
+    return [_plain(v) for v in value] if isinstance(value, (tuple, list)) else value
+
+
+class StateLog(object):
+    """Append-only log of the controller state, with compaction.
+
+    The state is a set of tables, each a dict key -> value of JSON-friendly
+    data (tuples are stored as lists). sync() compares a table with what was
+    last logged and only buffers the entries that changed or disappeared;
+    flush() appends the buffered records with one write. When the log holds
+    more than compact_ratio records per live entry it is rewritten from the
+    live state into a temporary file and renamed over the old one, so a
+    crash leaves either the old or the new log. load() skips a truncated
+    last record.
+    """
+
+    def __init__(self, path, compact_ratio=4, min_records=1000, fsync=False):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.min_records = min_records
+        self.fsync = fsync
+
+        self.tables = {} # tabella -> {chiave: valore} come scritto nel log
+        self.records = 0
+        self.compactions = 0
+        self._buffer = []
+
+    def load(self):
+        self.tables = {}
+        self.records = 0
+        if not os.path.exists(self.path):
+            return self.tables
+        valid = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # ultima riga scritta a meta'
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break # ultima riga scritta a meta'
+                op, table, key = record[0], record[1], _key(record[2])
+                if op == 's':
+                    self.tables.setdefault(table, {})[key] = record[3]
+                else:
+                    self.tables.get(table, {}).pop(key, None)
+                self.records += 1
+                valid += len(line)
+        if valid < os.path.getsize(self.path):
+            # i record aggiunti dopo non devono finire attaccati alla riga troncata
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid)
+        return self.tables
+
+    def set(self, table, key, value):
+        value = _plain(value)
+        entries = self.tables.setdefault(table, {})
+        if entries.get(key, self) == value:
+            return
+        entries[key] = value
+        self._buffer.append(json.dumps(['s', table, _plain(key), value]))
+
+    def delete(self, table, key):
+        entries = self.tables.get(table, {})
+        if key in entries:
+            del entries[key]
+            self._buffer.append(json.dumps(['d', table, _plain(key)]))
+
+    def sync(self, table, current):
+        """Log the differences between a table and the dict `current`."""
+        for key in [key for key in self.tables.get(table, {}) if key not in current]:
+            self.delete(table, key)
+        for key, value in current.items():
+            self.set(table, key, value)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if self.records + len(self._buffer) > max(self.min_records, self.compact_ratio * self.live()):
+            self._buffer = []
+            self.compact()
+            return
+        with open(self.path, 'a') as f:
+            f.write('\n'.join(self._buffer) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.records += len(self._buffer)
+        self._buffer = []
+
+    def compact(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            for table, entries in self.tables.items():
+                for key, value in entries.items():
+                    f.write(json.dumps(['s', table, _plain(key), value]) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.records = self.live()
+        self.compactions += 1
+
+    def live(self):
+        return sum(len(entries) for entries in self.tables.values())
@@ -0,0 +1,196 @@
+import abc
+import csv
+import glob
+import os
+import struct
+import threading
+import time
+
+FIELDNAMES = ['timestamp', 'dpid', 'port_no', 'rx_bytes', 'tx_bytes', 'rx_throughput', 'tx_throughput', 'num_active_ports', 'active_ports', 'blocklist']
+
+# record binario a larghezza fissa:
+# timestamp, dpid, port_no, rx_bytes, tx_bytes, rx_throughput, tx_throughput, num_active_ports
+RECORD = struct.Struct('<dQIQQddi')
+MAGIC = b'NCISPS01'
+
+
+class StatsSink(abc.ABC):
+    """Buffered, rotating writer for port statistics rows.
+
+    Rows are tuples in FIELDNAMES order (timestamp as epoch seconds,
+    active_ports/blocklist already rendered as strings). write() only
+    appends to an in-memory buffer; a dedicated writer thread flushes it
+    when batch_size rows are pending or every flush_interval seconds.
+    An existing file is appended to; it is rotated once it reaches
+    max_bytes or has been written for max_age seconds since this sink
+    opened it.
+    """
+    mode = 'a'
+
+    def __init__(self, path, batch_size=1024, flush_interval=2.0,
+                 max_bytes=64 * 1024 * 1024, max_age=3600, backup_count=10):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.rotations = 0
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._file = None
+        self._opened = None
+
+        self.thread_writer = threading.Thread(target=self._run)
+        self.thread_writer.daemon = True
+        self.thread_writer.start()
+
+    def write(self, rows):
+        with self._lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        with self._io_lock:
+            if self._file is not None and self._should_rotate():
+                self._close_file()
+                self._rotate()
+            if self._file is None:
+                self._open_file()
+            self._write_rows(rows)
+            self._file.flush()
+            self.rows_written += len(rows)
+            self.flushes += 1
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        with self._io_lock:
+            self._close_file()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _should_rotate(self):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        # l'eta' parte da quando questo sink ha aperto il file, non dalla sua mtime
+        return bool(self.max_age) and time.time() - self._opened >= self.max_age
+
+    def _rotate(self):
+        root, ext = os.path.splitext(self.path)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(os.path.getmtime(self.path)))
+        target = f'{root}.{stamp}{ext}'
+        n = 1
+        while os.path.exists(target):
+            target = f'{root}.{stamp}-{n}{ext}'
+            n += 1
+        os.rename(self.path, target)
+        self.rotations += 1
+
+        if self.backup_count:
+            old = sorted(glob.glob(f'{glob.escape(root)}.*{ext}'), key=os.path.getmtime)
+            for name in old[:-self.backup_count]:
+                os.remove(name)
+
+    def _open_file(self):
+        self._file = open(self.path, self.mode)
+        self._opened = time.time()
+        # le tracce precedenti non si toccano: si continua in coda
+        if not self._file.tell():
+            self._write_header()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_header(self):
+        pass
+
+    @abc.abstractmethod
+    def _write_rows(self, rows):
+        pass
+
+
+class CsvStatsSink(StatsSink):
+    def __init__(self, *args, **kwargs):
+        self._last_second = None
+        self._last_stamp = ''
+        super(CsvStatsSink, self).__init__(*args, **kwargs)
+
+    def _open_file(self):
+        self._file = open(self.path, self.mode, newline='')
+        self._opened = time.time()
+        self._writer = csv.writer(self._file)
+        if not self._file.tell():
+            self._write_header()
+
+    def _write_header(self):
+        self._writer.writerow(FIELDNAMES)
+
+    def _human_timestamp(self, timestamp):
+        # strftime una sola volta per secondo, non per riga
+        second = int(timestamp)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        return self._last_stamp
+
+    def _write_rows(self, rows):
+        stamp = self._human_timestamp
+        self._writer.writerows((stamp(row[0]),) + tuple(row[1:]) for row in rows)
+
+
+class BinaryStatsSink(StatsSink):
+    """Fixed-width little-endian records (see RECORD) after an 8 byte MAGIC.
+
+    active_ports and blocklist are not stored: they can be rebuilt from the
+    per-port rates and are by far the most expensive part of the CSV.
+    """
+    mode = 'ab'
+
+    def _write_header(self):
+        self._file.write(MAGIC)
+
+    def _write_rows(self, rows):
+        pack = RECORD.pack
+        self._file.write(b''.join(pack(*row[:8]) for row in rows))
+
+
+def read_binary(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a binary port stats trace')
+        while True:
+            chunk = f.read(RECORD.size * 4096)
+            if not chunk:
+                break
+            yield from RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % RECORD.size])
+
+
+SINKS = {
+    'csv': CsvStatsSink,
+    'bin': BinaryStatsSink,
+}
+
+
+def make_sink(fmt, path, **kwargs):
+    return SINKS[fmt](path, **kwargs)
@@ -0,0 +1,46 @@
+from detection import NO_LIMIT, attribute_congestion, evaluate_reply, final_threshold
+
+
+def test_final_threshold():
+    assert final_threshold(1000, 1) == NO_LIMIT
+    assert final_threshold(1000, 2) == 550
+
+
+def test_port_over_threshold_enters_watchlist():
+    alarms, watch_updates, blocks = evaluate_reply(3, [1, 2], [500.0, 10.0], 2, 300, {}, {})
+    assert alarms == [(1, 500.0)]
+    assert watch_updates == {(3, 1): 0}
+    assert blocks == []
+
+
+def test_watched_port_is_blocked_past_watch_limit():
+    watchlist = {(3, 1): 1}
+    alarms, watch_updates, blocks = evaluate_reply(3, [1], [500.0], 2, 300, watchlist, {}, watch_limit=1)
+    assert watch_updates == {(3, 1): 2}
+    # soglia finale: 330 / 2 porte attive = 165
+    assert blocks == [(3, 1)]
+    # evaluate_reply non modifica lo stato: applica il chiamante
+    assert watchlist == {(3, 1): 1}
+
+
+def test_counter_decreases_under_threshold():
+    _, watch_updates, blocks = evaluate_reply(3, [1], [100.0], 2, 300, {(3, 1): 2}, {})
+    assert watch_updates == {(3, 1): 1}
+    assert blocks == []
+
+
+def test_blocked_port_is_not_watched_again():
+    _, watch_updates, _ = evaluate_reply(3, [1], [500.0], 2, 300, {}, {(3, 1): 99.0})
+    assert watch_updates == {}
+
+
+def test_no_alarm_with_a_single_active_port_or_unmonitored_switch():
+    assert evaluate_reply(3, [1], [500.0], 1, 300, {}, {}) == ([], {}, [])
+    assert evaluate_reply(1, [1], [500.0], 2, 300, {}, {}, monitored=False) == ([], {}, [])
+
+
+def test_attribute_congestion():
+    share, offenders = attribute_congestion(1000, {(1, 1): 900.0, (2, 1): 100.0, (3, 1): 1.0}, 10)
+    assert share == 550
+    assert offenders == [(1, 1)]
+    assert attribute_congestion(1000, {(1, 1): 900.0}, 10) == (NO_LIMIT, [])
@@ -0,0 +1,50 @@
+import json
+
+from netgraph import DEFAULT_LINKS, NetworkGraph
+
+
+def test_upstream_on_default_links():
+    graph = NetworkGraph(DEFAULT_LINKS)
+    # s3 -> s4: tutto il traffico di s1 e s2 verso s4 passa da s3
+    assert graph.upstream(3, 3) == {1, 2, 3}
+    assert graph.upstream(1, 2) == {1}
+    assert graph.upstream(3, 1) == {2, 3, 4}
+    assert graph.upstream(1, 1) == set()
+
+
+def test_is_edge_port():
+    graph = NetworkGraph(DEFAULT_LINKS)
+    assert graph.is_edge_port(1, 1)
+    assert not graph.is_edge_port(1, 2)
+    assert not graph.is_edge_port(3, 3)
+    assert 4 in graph and 5 not in graph
+
+
+def test_next_hops_on_a_tree():
+    # s1 radice, s2 e s3 figli di s1, s4 figlio di s2
+    graph = NetworkGraph([(1, 1, 2, 1), (1, 2, 3, 1), (2, 2, 4, 1)])
+    assert graph.next_hops(4, 5) == {4: 5, 2: 2, 1: 1, 3: 1}
+    assert graph.next_hops(3, 5) == {3: 5, 1: 2, 2: 1, 4: 1}
+    assert graph.path(4, 3) == [4, 2, 1, 3]
+
+
+def test_remove_link_invalidates_cached_trees():
+    graph = NetworkGraph(DEFAULT_LINKS)
+    assert graph.next_hops(4, 2) == {4: 2, 3: 3, 1: 2, 2: 2}
+    assert graph.upstream(3, 3) == {1, 2, 3}
+
+    graph.remove_link(3, 3, 4, 1)
+    assert graph.next_hops(4, 2) == {4: 2}
+    assert graph.upstream(3, 3) == set()
+    assert graph.is_edge_port(3, 3)
+    assert graph.path(1, 4) == []
+    assert graph.path(1, 2) == [1, 3, 2]
+
+
+def test_from_file(tmp_path):
+    path = tmp_path / 'graph.json'
+    path.write_text(json.dumps({'links': [{'src': 1, 'src_port': 2, 'dst': 3, 'dst_port': 1, 'capacity': 375000},
+                                          {'src': 3, 'src_port': 3, 'dst': 4, 'dst_port': 1}]}))
+    graph = NetworkGraph.from_file(str(path))
+    assert graph.capacity == {(1, 2): 375000, (3, 1): 375000}
+    assert graph.next_hops(4, 2) == {4: 2, 3: 3, 1: 2}
@@ -0,0 +1,103 @@
+import struct
+import time
+
+import pytest
+
+from offload import (ACTIVE, ALARM, BLOCK, BLOCKED, COUNTERS, END, IN_RECORD, WATCH, DetectionPool, Detector,
+                     RingBuffer)
+
+RECORD = struct.Struct('<Q')
+
+
+@pytest.fixture
+def ring():
+    ring = RingBuffer(RECORD, capacity=4)
+    yield ring
+    ring.close(unlink=True)
+
+
+def test_ring_buffer_wraparound(ring):
+    seen = []
+    for start in range(0, 20, 3):
+        assert ring.push([(i,) for i in range(start, start + 3)])
+        seen += ring.pop()
+    assert seen == [(i,) for i in range(21)]
+
+
+def test_ring_buffer_full(ring):
+    assert ring.push([(1,), (2,), (3,)])
+    assert not ring.push([(4,), (5,)])
+    assert ring.pop(max_records=2) == [(1,), (2,)]
+    assert not ring.push([(4,), (5,), (6,), (7,)])
+    assert ring.push([(4,), (5,), (6,)])
+    assert ring.pop() == [(3,), (4,), (5,), (6,)]
+    assert ring.pop() == []
+
+
+def test_ring_buffer_attach_by_name(ring):
+    other = RingBuffer(RECORD, capacity=4, name=ring.name)
+    try:
+        ring.push([(7,)])
+        assert other.pop() == [(7,)]
+        ring.stop()
+        assert other.stopped()
+    finally:
+        other.close()
+
+
+def test_detector_blocks_like_the_controller():
+    detector = Detector(threshold=300, lower_threshold=6, watch_limit=1, monitored_dpids=[3],
+                        detection_rate='raw')
+    out = []
+    counters = {1: 0, 2: 0, 3: 0}
+    for tick in range(6):
+        counters[1] += 1000
+        counters[2] += 100
+        counters[3] += 100
+        records = [(COUNTERS, port_no, 3, 0.0, rx, 0) for port_no, rx in counters.items()]
+        records.append((END, 0, 3, float(tick), 0, 0))
+        out += detector.handle(records)
+
+    assert (WATCH, 1, 3, 0) in out
+    assert [record for record in out if record[0] == BLOCK] == [(BLOCK, 1, 3, 1000.0)]
+    assert (3, 1) in detector.blocked and (3, 1) not in detector.watchlist
+    assert out[-1][0] == ACTIVE
+    assert IN_RECORD.size == struct.calcsize('<BIQdQQ')
+
+
+PARAMS = {'threshold': 10 ** 9, 'lower_threshold': 0, 'watch_limit': 1, 'monitored_dpids': [],
+          'detection_rate': 'raw'}
+
+
+def test_results_rotate_between_workers():
+    pool = DetectionPool(2, PARAMS, capacity=16)
+    try:
+        for dpid, (_, outbox, _) in enumerate(pool.workers):
+            outbox.push([(ALARM, 1, dpid, 0.0)] * 2)
+        assert [record[2] for record in pool.results(1)] == [0]
+        assert [record[2] for record in pool.results(1)] == [1]
+        assert [record[2] for record in pool.results(1)] == [0]
+    finally:
+        pool.close()
+
+
+def test_restarted_worker_gets_current_blocks():
+    pool = DetectionPool(1, PARAMS, capacity=64)
+    try:
+        pool.notify(BLOCKED, 7, 9)
+        process = pool.workers[0][2]
+        process.kill()
+        process.join()
+        assert pool.check() == 1
+
+        for tick in range(3):
+            pool.submit(3, [1, 2, 3], [1000 * tick] * 3, [0] * 3, float(tick))
+        active = []
+        deadline = time.time() + 10
+        while len(active) < 2 and time.time() < deadline:
+            active += [record[3] for record in pool.results() if record[0] == ACTIVE]
+            time.sleep(0.01)
+        # terza reply: 3 porte attive - 1 - 1 porta bloccata
+        assert active[-1] == 1
+    finally:
+        pool.close()
@@ -0,0 +1,81 @@
+from ofp_batcher import FlowModBatcher
+
+ADD, DELETE = 0, 3
+
+
+class FakeOfproto(object):
+    OFPFC_ADD = ADD
+    OFPFC_DELETE = DELETE
+
+
+class FakeMod(object):
+    def __init__(self, command, match, priority=2, table_id=0):
+        self.command = command
+        self.match = match
+        self.priority = priority
+        self.table_id = table_id
+
+
+class FakeParser(object):
+    @staticmethod
+    def OFPBarrierRequest(datapath):
+        return 'barrier'
+
+
+class FakeDatapath(object):
+    ofproto = FakeOfproto
+    ofproto_parser = FakeParser
+
+    def __init__(self, dpid=1):
+        self.id = dpid
+        self.sent = []
+
+    def send_msg(self, msg):
+        self.sent.append(msg)
+
+
+def test_flush_sends_in_order_with_one_barrier():
+    batcher = FlowModBatcher()
+    dp = FakeDatapath()
+    mods = [FakeMod(ADD, {'in_port': 1}), FakeMod(ADD, {'in_port': 2})]
+    for mod in mods:
+        batcher.queue(dp, mod)
+    assert dp.sent == []
+    batcher.flush()
+    assert dp.sent == mods + ['barrier']
+    assert batcher.sent == 2
+
+
+def test_delete_cancels_pending_add_and_repeated_delete():
+    batcher = FlowModBatcher()
+    dp = FakeDatapath()
+    batcher.queue(dp, FakeMod(ADD, {'in_port': 1}))
+    delete = FakeMod(DELETE, {'in_port': 1})
+    batcher.queue(dp, delete)
+    batcher.queue(dp, FakeMod(DELETE, {'in_port': 1}))
+    batcher.flush()
+    assert dp.sent == [delete, 'barrier']
+    assert batcher.saved == 2
+
+
+def test_identical_add_replaces_pending_one():
+    batcher = FlowModBatcher()
+    dp = FakeDatapath()
+    batcher.queue(dp, FakeMod(ADD, {'in_port': 1}))
+    latest = FakeMod(ADD, {'in_port': 1})
+    batcher.queue(dp, latest)
+    batcher.flush()
+    assert dp.sent == [latest, 'barrier']
+
+
+def test_send_now_goes_after_queued_mods():
+    batcher = FlowModBatcher()
+    dp = FakeDatapath()
+    other = FakeDatapath(2)
+    delete = FakeMod(DELETE, {'in_port': 1})
+    batcher.queue(dp, delete)
+    batcher.queue(other, FakeMod(ADD, {'in_port': 1}))
+    batcher.send_now(dp, 'meter delete')
+    assert dp.sent == [delete, 'barrier', 'meter delete']
+    # la coda degli altri switch resta in attesa
+    assert other.sent == []
@@ -0,0 +1,38 @@
+import threading
+import time
+
+from poller import StatsPoller
+
+
+def test_due_staggers_and_reschedules():
+    poller = StatsPoller(base_interval=2.0)
+    poller.add(1, 100.0)
+    poller.add(2, 100.0)
+    assert poller.due(100.0) == [1]
+    assert poller.due(102.0) == [2]
+    # la prima richiesta non ha ancora risposta: max_outstanding=1
+    assert poller.due(102.5) == []
+    assert poller.skipped == 1
+    assert poller.replied(1) == 100.0
+
+
+def test_hot_datapath_is_polled_sooner():
+    poller = StatsPoller(base_interval=2.0, min_interval=1.0, max_interval=8.0)
+    poller.add(1, 0.0)
+    poller.due(0.0)
+    poller.replied(1)
+    poller.update(1, hot=False, idle=True, now=0.0)
+    assert poller.intervals[1] == 3.0
+    poller.update(1, hot=True, idle=False, now=0.5)
+    assert poller.next_delay(0.5) == 1.0
+
+
+def test_wait_blocks_until_a_datapath_is_added():
+    poller = StatsPoller()
+    assert poller.next_delay(time.time()) is None
+    timer = threading.Timer(0.1, poller.add, (1, time.time()))
+    timer.start()
+    start = time.time()
+    poller.wait(max_wait=5)
+    assert 0.05 < time.time() - start < 2
+    timer.join()
@@ -0,0 +1,26 @@
+from port_store import PortStatsStore
+
+
+def test_first_reply_has_no_rates():
+    store = PortStatsStore()
+    new_ports, rates = store.update(1, [1, 2], [100, 200], [10, 20], 10.0)
+    assert new_ports == [1, 2]
+    assert rates == []
+    assert (1, 2) in store and (1, 3) not in store
+
+
+def test_rates_are_bytes_per_second():
+    store = PortStatsStore()
+    store.update(1, [1, 2], [100, 200], [10, 20], 10.0)
+    _, rates = store.update(1, [1, 2], [300, 200], [50, 20], 12.0)
+    assert rates == [(1, 100.0, 20.0, True), (2, 0.0, 0.0, False)]
+    assert store.get(1, 1, 'rx_throughput') == 100.0
+    assert store.column(1, 'tx_throughput') == [20.0, 0.0]
+
+
+def test_restore_gives_a_rate_on_the_first_reply():
+    store = PortStatsStore()
+    store.restore(3, 1, 1000, 0, 5.0)
+    new_ports, rates = store.update(3, [1], [3000], [0], 7.0)
+    assert new_ports == []
+    assert rates == [(1, 1000.0, 0.0, True)]
@@ -0,0 +1,27 @@
+import pytest
+
+from rate_estimator import RateEstimator
+
+
+def test_ewma():
+    estimator = RateEstimator(window=4, alpha=0.5)
+    assert estimator.add(0, 100.0) == 100.0
+    assert estimator.add(0, 200.0) == 150.0
+    assert estimator.ewma(1) == 0.0
+
+
+def test_window_keeps_last_samples():
+    estimator = RateEstimator(window=4)
+    for rate in range(1, 7):
+        estimator.add(2, float(rate))
+    assert sorted(estimator.recent(2)) == [3.0, 4.0, 5.0, 6.0]
+    assert estimator.min(2) == 3.0
+    assert estimator.max(2) == 6.0
+    assert estimator.percentile(2, 50) == 4.0
+    assert estimator.recent(0) == []
+    assert estimator.stats(2)['samples'] == 6
+
+
+def test_unknown_estimate():
+    with pytest.raises(ValueError):
+        RateEstimator().estimate(0, 'median')
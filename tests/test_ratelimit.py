@@ -0,0 +1,24 @@
+from ratelimit import RateLimiter
+
+
+def test_burst_then_refill():
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.allow('a', 0.0) for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow('a', 0.5)
+    assert not limiter.allow('a', 0.5)
+    assert (limiter.accepted, limiter.dropped) == (4, 2)
+
+
+def test_keys_are_independent():
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.allow(('s1', 1), 0.0)
+    assert limiter.allow(('s1', 2), 0.0)
+    assert not limiter.allow(('s1', 1), 0.0)
+
+
+def test_idle_keys_are_pruned():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    limiter.allow('a', 0.0)
+    limiter.allow('b', 0.0)
+    limiter.allow('c', 10.0)
+    assert set(limiter.buckets) == {'c'}
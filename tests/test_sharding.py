@@ -0,0 +1,35 @@
+from sharding import ClusterStore, rendezvous_owner
+
+
+def test_rendezvous_owner_is_stable():
+    members = ['a', 'b', 'c']
+    owners = {dpid: rendezvous_owner(dpid, members) for dpid in range(1, 200)}
+    assert owners == {dpid: rendezvous_owner(dpid, list(reversed(members))) for dpid in range(1, 200)}
+    assert set(owners.values()) == set(members)
+    assert rendezvous_owner(1, []) is None
+
+
+def test_only_the_leaving_members_datapaths_move():
+    owners = {dpid: rendezvous_owner(dpid, ['a', 'b', 'c']) for dpid in range(1, 200)}
+    after = {dpid: rendezvous_owner(dpid, ['a', 'c']) for dpid in range(1, 200)}
+    for dpid, owner in owners.items():
+        if owner != 'b':
+            assert after[dpid] == owner
+
+
+def test_members_and_decisions(tmp_path):
+    path = str(tmp_path / 'cluster.db')
+    a = ClusterStore(path, 'a', heartbeat_timeout=3.0)
+    b = ClusterStore(path, 'b', heartbeat_timeout=3.0)
+    a.heartbeat(100.0)
+    b.heartbeat(98.0)
+    assert a.members(100.0) == ['a', 'b']
+    assert a.members(101.5) == ['a']
+
+    a.publish('block', (3, 1), 200.0)
+    assert a.decisions(150.0) == []
+    assert b.decisions(150.0) == [('block', (3, 1), 200.0)]
+    assert b.decisions(150.0) == []
+    assert ClusterStore(path, 'c').active_decisions(150.0) == [('block', (3, 1), 200.0)]
+
+    assert a.next_generation() < b.next_generation()
@@ -0,0 +1,34 @@
+from sketch import CountMinSketch, SpaceSaving
+
+
+def test_count_min_never_underestimates():
+    sketch = CountMinSketch(width=64, depth=4)
+    counts = {('flow', i): i * 10 for i in range(200)}
+    for key, count in counts.items():
+        sketch.add(key, count)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+    assert sketch.total == sum(counts.values())
+    sketch.clear()
+    assert sketch.estimate(('flow', 199)) == 0
+
+
+def test_space_saving_keeps_heavy_hitters():
+    top = SpaceSaving(k=4)
+    top.add('heavy', 1000)
+    for i in range(50):
+        top.add(i, 1)
+    top.add('heavy', 1000)
+    assert len(top.counts) == 4
+    assert top.top(1) == [('heavy', 2000)]
+    top.clear()
+    assert top.top() == []
+
+
+def test_space_saving_error_bound():
+    top = SpaceSaving(k=2)
+    top.add('a', 5)
+    top.add('b', 3)
+    top.add('c', 1)
+    # c prende il posto di b ed eredita il suo conteggio come errore
+    assert top.counts == {'a': 5, 'c': 4}
+    assert top.errors['c'] == 3
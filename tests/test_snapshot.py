@@ -0,0 +1,52 @@
+from snapshot import StateLog
+
+
+def test_load_replays_sets_and_deletes(tmp_path):
+    path = str(tmp_path / 'state.log')
+    log = StateLog(path)
+    log.sync('block', {(3, 1): 100.0, (3, 2): 200.0})
+    log.flush()
+    log.sync('block', {(3, 2): 250.0})
+    log.set('mac', (1, 'aa'), 2)
+    log.flush()
+
+    tables = StateLog(path).load()
+    assert tables == {'block': {(3, 2): 250.0}, 'mac': {(1, 'aa'): 2}}
+
+
+def test_unchanged_entries_are_not_logged(tmp_path):
+    log = StateLog(str(tmp_path / 'state.log'))
+    log.sync('watch', {(3, 1): 0})
+    log.flush()
+    log.sync('watch', {(3, 1): 0})
+    log.flush()
+    assert log.records == 1
+
+
+def test_truncated_last_record_is_dropped(tmp_path):
+    path = tmp_path / 'state.log'
+    log = StateLog(str(path))
+    log.set('block', (3, 1), 100.0)
+    log.flush()
+    with open(path, 'a') as f:
+        f.write('["s", "block", [3, 2], 20')
+
+    log = StateLog(str(path))
+    assert log.load() == {'block': {(3, 1): 100.0}}
+    # i record scritti dopo non finiscono attaccati alla riga troncata
+    log.set('block', (3, 3), 300.0)
+    log.flush()
+    assert StateLog(str(path)).load() == {'block': {(3, 1): 100.0, (3, 3): 300.0}}
+
+
+def test_compaction_keeps_only_live_entries(tmp_path):
+    path = tmp_path / 'state.log'
+    log = StateLog(str(path), compact_ratio=2, min_records=4)
+    for i in range(10):
+        log.set('port', (1, 1), i)
+        log.flush()
+    assert log.compactions >= 1
+    assert log.records <= 4
+    assert len(path.read_text().splitlines()) == log.records
+    assert StateLog(str(path)).load() == {'port': {(1, 1): 9}}
+    assert not (tmp_path / 'state.log.tmp').exists()
@@ -0,0 +1,56 @@
+import csv
+import os
+
+import pytest
+
+from stats_sink import FIELDNAMES, StatsSink, make_sink, read_binary
+
+ROW = (1700000000.0, 3, 1, 1000, 2000, 10.0, 20.0, 2, '[1, 2]', '{}')
+
+
+def test_stats_sink_is_abstract():
+    with pytest.raises(TypeError):
+        StatsSink('unused.csv')
+
+
+def test_csv_appends_to_existing_trace(tmp_path):
+    path = str(tmp_path / 'port_stats.csv')
+    for _ in range(2):
+        sink = make_sink('csv', path)
+        sink.write([ROW])
+        sink.close()
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    # una sola intestazione, nessuna rotazione all'avvio
+    assert rows[0] == FIELDNAMES
+    assert len(rows) == 3
+    assert list(tmp_path.iterdir()) == [tmp_path / 'port_stats.csv']
+
+
+def test_rotates_on_size(tmp_path):
+    path = str(tmp_path / 'port_stats.bin')
+    sink = make_sink('bin', path, max_bytes=64)
+    for _ in range(3):
+        sink.write([ROW])
+        sink.flush()
+    sink.close()
+    assert sink.rotations == 2
+    assert len(list(tmp_path.iterdir())) == 3
+    assert [record[1:3] for record in read_binary(path)] == [(3, 1)]
+
+
+def test_rotates_on_age_since_open(tmp_path):
+    path = tmp_path / 'port_stats.csv'
+    path.write_text(','.join(FIELDNAMES) + '\n')
+    # un file vecchio non viene ruotato all'apertura: l'eta' parte da _open_file
+    os.utime(path, (0, 0))
+    sink = make_sink('csv', str(path), max_age=3600)
+    sink.write([ROW])
+    sink.flush()
+    assert sink.rotations == 0
+    sink._opened -= 3600
+    sink.write([ROW])
+    sink.flush()
+    sink.close()
+    assert sink.rotations == 1
+    assert len(list(tmp_path.iterdir())) == 2
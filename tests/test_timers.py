@@ -0,0 +1,35 @@
+import threading
+import time
+
+from timers import DeadlineHeap
+
+
+def test_pop_expired_in_deadline_order():
+    timers = DeadlineHeap()
+    timers.schedule('b', 20.0)
+    timers.schedule('a', 10.0)
+    timers.schedule('c', 30.0)
+    assert timers.pop_expired(25.0) == ['a', 'b']
+    assert len(timers) == 1 and 'c' in timers
+    assert timers.next_deadline() == 30.0
+
+
+def test_cancel_and_reschedule():
+    timers = DeadlineHeap()
+    timers.schedule('a', 10.0)
+    timers.schedule('b', 10.0)
+    timers.cancel('a')
+    timers.schedule('b', 40.0)
+    assert timers.pop_expired(20.0) == []
+    assert timers.pop_expired(40.0) == ['b']
+
+
+def test_wait_wakes_up_on_an_earlier_deadline():
+    timers = DeadlineHeap()
+    timers.schedule('late', time.time() + 60)
+    timers.wait(max_wait=0) # consuma la sveglia di 'late'
+    threading.Timer(0.1, timers.schedule, ('soon', time.time())).start()
+    start = time.time()
+    timers.wait(max_wait=5)
+    assert time.time() - start < 2
+    assert timers.pop_expired(time.time()) == ['soon']
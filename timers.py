@@ -0,0 +1,68 @@
+import heapq
+import threading
+import time
+
+
+class DeadlineHeap(object):
+    """Keys with an expiry deadline, kept in a min-heap.
+
+    schedule() and cancel() are O(log n) (cancelled or rescheduled entries
+    are left in the heap and skipped when popped). wait() sleeps until the
+    earliest deadline or until an earlier one is scheduled; pass an eventlet
+    event as `wakeup` when the waiting loop is a green thread.
+    """
+
+    def __init__(self, wakeup=None):
+        self.deadlines = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = wakeup if wakeup is not None else threading.Event()
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def schedule(self, key, deadline):
+        with self._lock:
+            self.deadlines[key] = deadline
+            heapq.heappush(self._heap, (deadline, key))
+            earliest = self._heap[0][0] == deadline
+        if earliest:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        with self._lock:
+            self.deadlines.pop(key, None)
+
+    def pop_expired(self, now):
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, key = heapq.heappop(self._heap)
+                if self.deadlines.get(key) == deadline:
+                    del self.deadlines[key]
+                    expired.append(key)
+        return expired
+
+    def next_deadline(self):
+        with self._lock:
+            self._discard_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def wait(self, max_wait=None):
+        with self._lock:
+            self._discard_stale()
+            timeout = max_wait
+            if self._heap:
+                timeout = max(self._heap[0][0] - time.time(), 0)
+                if max_wait is not None:
+                    timeout = min(timeout, max_wait)
+        if timeout is None or timeout > 0:
+            self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def _discard_stale(self):
+        while self._heap and self.deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
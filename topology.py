@@ -1,7 +1,8 @@
 #!/usr/bin/python
-import threading
 import random
 import time
+import json
+import sys
 from mininet.log import setLogLevel, info
 from mininet.topo import Topo
 from mininet.net import Mininet, CLI
@@ -9,58 +10,251 @@ from mininet.node import OVSKernelSwitch, Host
 from mininet.link import TCLink, Link
 from mininet.node import RemoteController #Controller
 
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# profili dei link (bw in Mbit/s, delay): quelli della topologia del progetto
+HOST_LINK = {'bw': 6, 'delay': '0.0025ms'}
+SWITCH_LINK = {'bw': 3, 'delay': '25ms'}
+
+
+class TopologySpec(object):
+    "Hosts, switches and links of a network, with explicit port numbers."
+
+    def __init__(self, host_link=None, switch_link=None):
+        self.host_link = dict(HOST_LINK, **(host_link or {}))
+        self.switch_link = dict(SWITCH_LINK, **(switch_link or {}))
+        self.hosts = [] # nome
+        self.switches = [] # nome (sN -> dpid N)
+        self.links = [] # (nodo_a, porta_a, nodo_b, porta_b, parametri)
+        self.loops = False
+        self._ports = {}
+
+    def add_host(self):
+        self.hosts.append(f'h{len(self.hosts) + 1}')
+        return self.hosts[-1]
+
+    def add_switch(self):
+        self.switches.append(f's{len(self.switches) + 1}')
+        return self.switches[-1]
+
+    def add_link(self, a, b, **params):
+        if not params:
+            params = self.switch_link if a[0] == b[0] == 's' else self.host_link
+        port_a = self._ports[a] = self._ports.get(a, 0) + 1
+        port_b = self._ports[b] = self._ports.get(b, 0) + 1
+        self.links.append((a, port_a, b, port_b, params))
+
+    def switch_links(self):
+        "(dpid_a, port_a, dpid_b, port_b, capacity in byte/s or None) for every link between switches."
+        links = []
+        for a, port_a, b, port_b, params in self.links:
+            if a[0] == b[0] == 's':
+                capacity = params['bw'] * 1000000 / 8 if params.get('bw') else None # Mbit/s -> byte/s
+                links.append((int(a[1:]), port_a, int(b[1:]), port_b, capacity))
+        return links
+
+    def dump_graph(self, path):
+        "Write the switch links as a topology file for NetworkGraph.from_file (NCIS_TOPOLOGY of the controller)."
+        links = []
+        for src, src_port, dst, dst_port, capacity in self.switch_links():
+            link = {'src': src, 'src_port': src_port, 'dst': dst, 'dst_port': dst_port}
+            if capacity:
+                link['capacity'] = capacity
+            links.append(link)
+        with open(path, 'w') as f:
+            json.dump({'links': links}, f, indent=1)
+
+
+def ncis(spec):
+    # la topologia del progetto: h1 e h4 su s1, h2 su s2, s1 e s2 su s3, s3 su s4, h3 su s4
+    h1, h2, h3, h4 = [spec.add_host() for _ in range(4)]
+    s1, s2, s3, s4 = [spec.add_switch() for _ in range(4)]
+    spec.add_link(h1, s1)
+    spec.add_link(h2, s2)
+    spec.add_link(s1, s3)
+    spec.add_link(s2, s3)
+    spec.add_link(s3, s4)
+    spec.add_link(s4, h3)
+    spec.add_link(h4, s1)
+
+
+def linear(spec, switches=4, hosts_per_switch=1):
+    previous = None
+    for _ in range(switches):
+        s = spec.add_switch()
+        for _ in range(hosts_per_switch):
+            spec.add_link(spec.add_host(), s)
+        if previous:
+            spec.add_link(previous, s)
+        previous = s
+
+
+def leaf_spine(spec, spines=2, leaves=4, hosts_per_leaf=2):
+    spine_switches = [spec.add_switch() for _ in range(spines)]
+    for _ in range(leaves):
+        leaf = spec.add_switch()
+        for _ in range(hosts_per_leaf):
+            spec.add_link(spec.add_host(), leaf)
+        for spine in spine_switches:
+            spec.add_link(leaf, spine)
+    spec.loops = spines > 1
+
+
+def fat_tree(spec, k=4):
+    if k % 2:
+        raise ValueError('fat_tree needs an even k')
+    half = k // 2
+    core = [spec.add_switch() for _ in range(half * half)]
+    for _ in range(k):
+        aggregation = [spec.add_switch() for _ in range(half)]
+        for j, agg in enumerate(aggregation):
+            for c in core[j * half:(j + 1) * half]:
+                spec.add_link(agg, c)
+        for _ in range(half):
+            edge = spec.add_switch()
+            for agg in aggregation:
+                spec.add_link(edge, agg)
+            for _ in range(half):
+                spec.add_link(spec.add_host(), edge)
+    spec.loops = True
+
+
+def random_graph(spec, switches=10, hosts=20, extra_links=5, seed=None):
+    rng = random.Random(seed)
+    nodes = [spec.add_switch() for _ in range(switches)]
+    connected = set()
+    # prima un albero casuale, cosi' la rete e' connessa
+    for i in range(1, switches):
+        j = rng.randrange(i)
+        spec.add_link(nodes[j], nodes[i])
+        connected.add((j, i))
+    for _ in range(extra_links):
+        i, j = sorted(rng.sample(range(switches), 2))
+        if (i, j) not in connected:
+            spec.add_link(nodes[i], nodes[j])
+            connected.add((i, j))
+            spec.loops = True
+    for _ in range(hosts):
+        spec.add_link(spec.add_host(), rng.choice(nodes))
+
+
+GENERATORS = {
+    'ncis': ncis,
+    'linear': linear,
+    'leaf_spine': leaf_spine,
+    'fat_tree': fat_tree,
+    'random': random_graph,
+}
+
+
+def load_spec(spec):
+    """Build a TopologySpec from a generator description.
+
+    spec is None (the project topology), a dict such as
+    {'generator': 'fat_tree', 'k': 4, 'host_link': {'bw': 10}} or the path
+    of a JSON/YAML file containing one.
+    """
+    if spec is None:
+        spec = {'generator': 'ncis'}
+    elif isinstance(spec, str):
+        with open(spec) as f:
+            if spec.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise RuntimeError('PyYAML is required for YAML topology files')
+                spec = yaml.safe_load(f)
+            else:
+                spec = json.load(f)
+    params = dict(spec)
+    generator = GENERATORS[params.pop('generator')]
+    topology = TopologySpec(params.pop('host_link', None), params.pop('switch_link', None))
+    generator(topology, **params)
+    return topology
+
+
 class Environment(object):
-    def __init__(self):
-        "Create a network."
-        self.net = Mininet(controller=RemoteController, link=TCLink) #controllore REMOTO
+    def __init__(self, spec=None, stp=None, controllers=None):
+        """Create a network.
+
+        controllers lists 'ip:port' of the controller processes (default: one on
+        127.0.0.1:6653); every switch connects to all of them.
+        """
+        self.spec = load_spec(spec)
+        # con cicli (fat-tree, leaf-spine, random) serve lo STP degli switch contro i broadcast storm
+        stp = self.spec.loops if stp is None else stp
+
+        start = time.time()
+        self.net = Mininet(controller=RemoteController, link=TCLink, build=False) #controllore REMOTO
         info("*** Starting controller\n")
-        c1 = self.net.addController( 'c1', controller=RemoteController) #Controller aggiunto alla topologia
-        
-        c1.start()
-        info("*** Adding hosts and switches\n")
-        self.h1 = self.net.addHost('h1', mac ='00:00:00:00:00:01', ip= '10.0.0.1') #indirizzo MAC e Ip sono opzionali 
-        self.h2 = self.net.addHost('h2', mac ='00:00:00:00:00:02', ip= '10.0.0.2')
-        self.h3 = self.net.addHost('h3', mac ='00:00:00:00:00:03', ip= '10.0.0.3')
-
-        # OPZIONALE
-        self.h4 = self.net.addHost('h4', mac ='00:00:00:00:00:04', ip= '10.0.0.4')
-        
-        self.cpe1 = self.net.addSwitch('s1', cls=OVSKernelSwitch, protocols='OpenFlow13') #gli switch devono essere di tipo openflow
-        self.cpe2 = self.net.addSwitch('s2', cls=OVSKernelSwitch, protocols='OpenFlow13')
-        self.cpe3 = self.net.addSwitch('s3', cls=OVSKernelSwitch, protocols='OpenFlow13')
-        self.cpe4 = self.net.addSwitch('s4', cls=OVSKernelSwitch, protocols='OpenFlow13')
-        info("*** Adding links\n")  
-        self.net.addLink(self.h1, self.cpe1, bw=6, delay='0.0025ms') #vanno bene queste bw e questi delay? sono obbligatori?
-        self.net.addLink(self.h2, self.cpe2, bw=6, delay='0.0025ms')  
-        self.net.addLink(self.cpe1, self.cpe3, bw=3, delay='25ms')
-        self.net.addLink(self.cpe2, self.cpe3, bw=3, delay='25ms')
-        self.net.addLink(self.cpe3, self.cpe4, bw=3, delay='25ms')
-        self.net.addLink(self.cpe4, self.h3, bw=6, delay='0.0025ms')
-
-        # OPZIONALE
-        self.net.addLink(self.h4, self.cpe1, bw=6, delay='0.0025ms')
+        self.controllers = []
+        for i, address in enumerate(controllers or ['127.0.0.1:6653'], 1):
+            ip, _, port = address.partition(':')
+            self.controllers.append(self.net.addController(f'c{i}', controller=RemoteController, #Controller aggiunto alla topologia
+                                                           ip=ip, port=int(port or 6653)))
+
+        info(f"*** Adding {len(self.spec.hosts)} hosts and {len(self.spec.switches)} switches\n")
+        self.hosts = {}
+        for i, name in enumerate(self.spec.hosts, 1):
+            # MAC e IP derivati dall'indice: h1 -> 00:00:00:00:00:01, 10.0.0.1
+            mac = ':'.join(f'{b:02x}' for b in i.to_bytes(6, 'big'))
+            ip = '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255)
+            self.hosts[name] = self.net.addHost(name, mac=mac, ip=ip + '/8')
+        self.switches = {}
+        for name in self.spec.switches:
+            self.switches[name] = self.net.addSwitch(name, cls=OVSKernelSwitch, protocols='OpenFlow13',
+                                                     dpid='%016x' % int(name[1:]), stp=stp)
+
+        info(f"*** Adding {len(self.spec.links)} links\n")
+        nodes = dict(self.hosts, **self.switches)
+        for a, port_a, b, port_b, params in self.spec.links:
+            self.net.addLink(nodes[a], nodes[b], port1=port_a, port2=port_b, **params)
 
+        # nomi usati dagli script esistenti per la topologia del progetto
+        for name, host in self.hosts.items():
+            setattr(self, name, host)
+        for name, switch in self.switches.items():
+            setattr(self, 'cpe' + name[1:], switch)
 
         info("*** Starting network\n")
         self.net.build()
+        for c in self.controllers:
+            c.start()
         self.net.start()
-        #la topologia del progetto ha:
-        #	h1 collegato a s1
-        #	s1 collegato al s3
-        #	h2 collegato a s2
-        #	s2 collegato ad s3
-        #	s3 collegato ad s4
-        #	h3 collegato ad s4
-        
-        # OPZIONALE
-        #   h4 collegato a s1
-
-...
+        info(f"*** Network ready in {time.time() - start:.1f}s\n")
+
+    def edge_port(self, host):
+        "(dpid, port) of the switch port a host is attached to."
+        for a, port_a, b, port_b, _ in self.spec.links:
+            if host in (a, b):
+                switch, port = (b, port_b) if a == host else (a, port_a)
+                return int(switch[1:]), port
+        return None
+
+    def switch_links(self):
+        "(dpid_a, port_a, dpid_b, port_b, capacity in byte/s or None) for every link between switches."
+        return self.spec.switch_links()
+
+    def dump_graph(self, path):
+        "Write the switch links as the controller topology file (NCIS_TOPOLOGY)."
+        self.spec.dump_graph(path)
+
+    def stop(self):
+        start = time.time()
+        self.net.stop()
+        info(f"*** Network stopped in {time.time() - start:.1f}s\n")
+
+
 if __name__ == '__main__':
 
     setLogLevel('info')
     info('starting the environment\n')
-    env = Environment()
+    # argomenti opzionali: file JSON/YAML con la topologia da generare ('-' per quella del
+    # progetto) e gli indirizzi ip:porta dei processi controller
+    spec = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] != '-' else None
+    env = Environment(spec, controllers=sys.argv[2:] or None)
 
     info("*** Running CLI\n")
     CLI(env.net)
+    env.stop()